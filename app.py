@@ -1,18 +1,53 @@
 """"The app to run Twee Voor Twaalf woordrader"""
 
+import atexit
+import contextlib
 import datetime
+import hashlib
+import json
 import logging
 import os
+import secrets
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
 
-import pandas as pd
-import psycopg
 from dotenv import load_dotenv
-from flask import Flask, jsonify, render_template, request, session
-from sqlalchemy import create_engine
-
+from flask import (
+    Flask,
+    Response,
+    abort,
+    g,
+    has_app_context,
+    has_request_context,
+    jsonify,
+    make_response,
+    render_template,
+    request,
+    session,
+)
+from flask.sessions import SecureCookieSessionInterface
+from psycopg import Connection
+from psycopg_pool import ConnectionPool
+
+from tweevoortwaalf import metrics
+from tweevoortwaalf.eventwriter import EventWriter
+from tweevoortwaalf.fragments import BoardFragment
+from tweevoortwaalf.gamestate import (
+    GameStateStore,
+    MemoryGameStateStore,
+    SQLiteGameStateStore,
+)
 from tweevoortwaalf.paardensprong import Paardensprong
+from tweevoortwaalf.puzzleimages import IMAGE_FORMATS, RenderedImageCache
+from tweevoortwaalf.puzzleoptions import PuzzleOptionsCache
+from tweevoortwaalf.puzzlepool import PuzzlePool
+from tweevoortwaalf.taartlayout import get_taartpuzzel_layout
 from tweevoortwaalf.taartpuzzel import Taartpuzzel
-from tweevoortwaalf.woordrader import WoordRader
+from tweevoortwaalf.woordpuzzel import Woordpuzzel
+from tweevoortwaalf.woordrader import WoordRader, WoordRaderState
 
 load_dotenv()
 
@@ -25,6 +60,245 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logger.setLevel("DEBUG")
 
+REQUEST_SECONDS = metrics.REGISTRY.histogram(
+    "tweevoortwaalf_request_seconds",
+    "Time to handle a request",
+    ["endpoint", "method", "status"],
+)
+SPAN_SECONDS = metrics.REGISTRY.histogram(
+    "tweevoortwaalf_span_seconds",
+    "Time spent in a part of handling a request, or in background work",
+    ["endpoint", "span"],
+)
+SPAN_ERRORS = metrics.REGISTRY.counter(
+    "tweevoortwaalf_span_errors_total",
+    "Number of parts of requests that raised an exception",
+    ["endpoint", "span"],
+)
+# Write a JSON line with the duration and spans of every request
+METRICS_LOG = os.getenv("METRICS_LOG", "0") == "1"
+
+
+@contextlib.contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a part of handling a request
+
+    Parts outside requests (such as filling the puzzle pools) get endpoint "background"
+    """
+    in_request = has_request_context()
+    endpoint = (request.endpoint or "unknown") if in_request else "background"
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        SPAN_ERRORS.inc(endpoint=endpoint, span=name)
+        raise
+    finally:
+        _record_span(name, time.perf_counter() - start, endpoint, in_request)
+
+
+def _record_span(name: str, seconds: float, endpoint: str, in_request: bool) -> None:
+    SPAN_SECONDS.observe(seconds, endpoint=endpoint, span=name)
+    if in_request and METRICS_LOG:
+        spans = g.setdefault("spans", {})
+        spans[name] = spans.get(name, 0.0) + seconds
+
+
+class TimedSessionInterface(SecureCookieSessionInterface):
+    """Signed cookie sessions, timing how long (de)serialising takes"""
+
+    def open_session(self, app, request):  # pylint: disable=redefined-outer-name
+        # The endpoint is not known yet, so this is recorded in `start_timer`
+        start = time.perf_counter()
+        opened = super().open_session(app, request)
+        g.session_open_seconds = time.perf_counter() - start
+        return opened
+
+    def save_session(
+        self, app, session, response
+    ):  # pylint: disable=redefined-outer-name
+        with span("session"):
+            super().save_session(app, session, response)
+
+
+app.session_interface = TimedSessionInterface()
+
+
+@app.before_request
+def start_timer():
+    """Remember when the request started"""
+    g.request_start = time.perf_counter()
+    if "session_open_seconds" in g:
+        _record_span(
+            "session", g.session_open_seconds, request.endpoint or "unknown", True
+        )
+
+
+@app.after_request
+def remember_status(response):
+    """Remember the status for the metrics, which are recorded at teardown"""
+    g.status = response.status_code
+    return response
+
+
+@app.teardown_request
+def record_request(_exception=None):
+    """Record the duration of the request, after the session has been saved"""
+    if "request_start" not in g:
+        return
+    seconds = time.perf_counter() - g.request_start
+    endpoint = request.endpoint or "unknown"
+    status = g.get("status", 500)
+    REQUEST_SECONDS.observe(
+        seconds, endpoint=endpoint, method=request.method, status=status
+    )
+    if METRICS_LOG:
+        logger.info(
+            json.dumps(
+                {
+                    "endpoint": endpoint,
+                    "method": request.method,
+                    "status": status,
+                    "seconds": round(seconds, 6),
+                    "spans": {
+                        name: round(value, 6)
+                        for name, value in g.get("spans", {}).items()
+                    },
+                }
+            )
+        )
+
+
+# Keyed by process id, so a worker never uses a resource inherited from its parent
+_WORKER_RESOURCES: dict[tuple[int, str], Any] = {}
+_WORKER_RESOURCES_LOCK = threading.RLock()
+
+
+def per_worker(name: str, factory: Callable[[], Any]) -> Any:
+    """Get a resource of this worker process, creating it on first use
+
+    Resources are created lazily, so every gunicorn worker gets its own after forking
+    """
+    key = (os.getpid(), name)
+    if key not in _WORKER_RESOURCES:
+        with _WORKER_RESOURCES_LOCK:
+            if key not in _WORKER_RESOURCES:
+                _WORKER_RESOURCES[key] = factory()
+    return _WORKER_RESOURCES[key]
+
+
+def _create_pool() -> ConnectionPool:
+    pool = ConnectionPool(
+        os.getenv("DATABASE_URL"),
+        min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+        max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+        timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        max_idle=float(os.getenv("DB_POOL_MAX_IDLE", "600")),
+        name="tweevoortwaalf",
+        open=True,
+    )
+    atexit.register(pool.close)
+    return pool
+
+
+def get_pool() -> ConnectionPool:
+    """Get the database connection pool of this worker
+
+    The size and timeouts can be configured with the environment variables
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT (seconds to wait for a
+    connection) and DB_POOL_MAX_IDLE (seconds before an idle connection is closed).
+    """
+    return per_worker("pool", _create_pool)
+
+
+def _create_event_writer() -> EventWriter:
+    writer = EventWriter(
+        get_pool(),
+        os.getenv("EVENT_SPILL_DIR", tempfile.gettempdir()),
+        batch_size=int(os.getenv("EVENT_BATCH_SIZE", "100")),
+        flush_interval=float(os.getenv("EVENT_FLUSH_INTERVAL", "1")),
+        max_spill_bytes=int(os.getenv("EVENT_SPILL_MAX_BYTES", "10000000")),
+    )
+    # Registered after the pool, so it is closed before the pool
+    atexit.register(writer.close)
+    return writer
+
+
+def get_event_writer() -> EventWriter:
+    """Get the event writer of this worker
+
+    Events are written in batches of at most EVENT_BATCH_SIZE rows, at least every
+    EVENT_FLUSH_INTERVAL seconds. While the database is unavailable, they are kept in
+    a spill file of at most EVENT_SPILL_MAX_BYTES in EVENT_SPILL_DIR.
+    """
+    return per_worker("event_writer", _create_event_writer)
+
+
+def _create_game_state_store() -> GameStateStore:
+    kind = os.getenv("GAME_STATE_STORE", "memory")
+    ttl = float(os.getenv("GAME_STATE_TTL", "3600"))
+    if kind == "memory":
+        return MemoryGameStateStore(
+            max_size=int(os.getenv("GAME_STATE_MAX_SIZE", "10000")), ttl=ttl
+        )
+    if kind == "sqlite":
+        path = os.getenv(
+            "GAME_STATE_PATH", os.path.join(tempfile.gettempdir(), "gamestate.sqlite")
+        )
+        return SQLiteGameStateStore(path, ttl=ttl)
+    raise ValueError(f"Unknown GAME_STATE_STORE {kind!r}")
+
+
+def get_game_state_store() -> GameStateStore:
+    """Get the store for games in progress of this worker
+
+    GAME_STATE_STORE selects "memory" (default; only for a single worker process) or
+    "sqlite" (a file at GAME_STATE_PATH shared by all workers). Games expire after
+    GAME_STATE_TTL seconds
+    """
+    return per_worker("game_state_store", _create_game_state_store)
+
+
+def load_game(puzzlename: str) -> dict | None:
+    """Get the game in progress of this player, or None if there is none"""
+    key = session.get(puzzlename)
+    if not isinstance(key, str):
+        return None
+    with span("game_state"):
+        return get_game_state_store().get(key)
+
+
+def save_game(puzzlename: str, game: dict) -> None:
+    """Store the game of this player, keeping only its key in the session cookie"""
+    key = session.get(puzzlename)
+    if not isinstance(key, str):
+        key = secrets.token_urlsafe(16)
+        session[puzzlename] = key
+    with span("game_state"):
+        get_game_state_store().set(key, game)
+
+
+def get_puzzleoptions(name: str) -> PuzzleOptionsCache:
+    """Get the cached hard mode puzzle options of this worker for game `name`
+
+    The options are read from the database again every PUZZLEOPTIONS_TTL seconds
+    """
+    return per_worker(
+        f"puzzleoptions_{name}",
+        lambda: PuzzleOptionsCache(
+            get_pool(), name, ttl=float(os.getenv("PUZZLEOPTIONS_TTL", "300"))
+        ),
+    )
+
+
+@contextlib.contextmanager
+def db_connection() -> Iterator[Connection]:
+    """A connection from the pool of this worker, timing how long getting it took"""
+    with contextlib.ExitStack() as stack:
+        with span("db_connect"):
+            conn = stack.enter_context(get_pool().connection())
+        yield conn
+
 
 def insert_data(table_name: str, data: dict, return_game_id=False) -> int | None:
     """Write data to the tweevoortwaalf database
@@ -45,8 +319,6 @@ def insert_data(table_name: str, data: dict, return_game_id=False) -> int | None
             otherwise, returns None
 
     """
-    database_url = os.getenv("DATABASE_URL")
-
     columns = ", ".join(data.keys())
     placeholders = ", ".join(["%s"] * len(data))
     values = tuple(data.values())
@@ -56,7 +328,7 @@ def insert_data(table_name: str, data: dict, return_game_id=False) -> int | None
         query += "RETURNING game_id"
     query += ";"
 
-    with psycopg.connect(database_url) as conn:  # pylint: disable=not-context-manager
+    with db_connection() as conn, span("db_execute"):
         with conn.cursor() as cur:
             cur.execute(query, values)
             if return_game_id:
@@ -67,17 +339,50 @@ def insert_data(table_name: str, data: dict, return_game_id=False) -> int | None
             return None
 
 
-def probability_option(p: float, n: float) -> float:
-    """Get weights, to select options with probability closest to 50%
+def insert_woordrader_game(data: dict, state: WoordRaderState) -> int:
+    """Write a woordrader game and its shown letters in a single statement
+
+    The game row is inserted in a CTE that feeds its game_id to the insert of all
+    shown letters, so the game is never stored without its letters
 
     Parameters
     ----------
-    p : float
-        The probability of getting the answer right
-    n : float
-        Power: Higher values make values far from 50% less likely to select
+    data : dict
+        Dictionary with column name as key and values as values of the game
+    state : WoordRaderState
+        The letters of the woordrader game
+
+    Returns
+    -------
+        game_id : int
+            The game_id of the new game
+    """
+    columns = ", ".join(data.keys())
+    placeholders = ", ".join(["%s"] * len(data))
+    letter_placeholders = ", ".join(["(%s::int, %s::text, %s::boolean)"] * len(state))
+    query = f"""
+        WITH game AS (
+            INSERT INTO woordrader.games ({columns})
+            VALUES ({placeholders})
+            RETURNING game_id
+        )
+        INSERT INTO woordrader.shownletters (game_id, position, shown_letter, correct)
+        SELECT game.game_id, letters.position, letters.shown_letter, letters.correct
+        FROM game
+        CROSS JOIN (VALUES {letter_placeholders})
+            AS letters (position, shown_letter, correct)
+        RETURNING game_id;
     """
-    return (p - p**2) ** n
+    values = list(data.values())
+    for quizposition, shown_letter in enumerate(state.shown):
+        values.extend([quizposition + 1, shown_letter, state.is_correct(quizposition)])
+
+    with db_connection() as conn, span("db_execute"):
+        with conn.cursor() as cur:
+            cur.execute(query, values)
+            result = cur.fetchone()[0]
+            conn.commit()
+            return result
 
 
 def clean_str(strng: str) -> str:
@@ -93,18 +398,68 @@ def is_guess_correct(guess: str, answer: str) -> bool:
     return clean_str(guess) == clean_str(answer)
 
 
+# The pages are the same for every visit, so are rendered once per worker and
+# revalidated by browsers with their ETag
+PAGE_MAX_AGE = int(os.getenv("PAGE_MAX_AGE", "300"))
+_PAGES: dict[tuple[str, str | None], tuple[str, str]] = {}
+
+
+def cached_page(template_name: str, **context):
+    """Render a page once, and answer with 304 Not Modified if the browser has it"""
+    key = (template_name, session.get("mode"))
+    if key not in _PAGES or app.debug:
+        with span("render"):
+            body = render_template(template_name, **context)
+        _PAGES[key] = (body, hashlib.sha1(body.encode()).hexdigest())
+    body, etag = _PAGES[key]
+    response = make_response(body)
+    response.set_etag(etag)
+    response.cache_control.max_age = PAGE_MAX_AGE
+    return response.make_conditional(request)
+
+
+def _render_board(puzzlename: str, **context) -> Callable[[Any], str]:
+    def render(state: Any) -> str:
+        return render_template(
+            f"{puzzlename}specific.html", state=state, active=True, **context
+        )
+
+    return render
+
+
+BOARDS = {
+    "woordrader": BoardFragment(
+        _render_board("woordrader"),
+        to_letters=lambda state: state.top_row(),
+        from_letters=list,
+    ),
+    "taartpuzzel": BoardFragment(
+        _render_board("taartpuzzel", layout=get_taartpuzzel_layout()),
+        to_letters=list,
+        from_letters=list,
+        # The missing letter gets a different class
+        structural={"?"},
+    ),
+    "paardensprong": BoardFragment(
+        _render_board("paardensprong"),
+        to_letters=lambda state: [letter for row in state for letter in row],
+        from_letters=lambda letters: [letters[i : i + 3] for i in range(0, 9, 3)],
+    ),
+}
+
+
 @app.route("/")
 def home():
     """Home page"""
-    return render_template("index.html")
+    return cached_page("index.html")
 
 
 @app.route("/woordrader")
 def woordrader():
     """Show empty woordrader page"""
-    state = {i: "" for i in range(12)}
+    state = [""] * 12
     active = False
-    return render_template(
+    return cached_page(
         "woordrader.html",
         state=state,
         active=active,
@@ -114,28 +469,127 @@ def woordrader():
 @app.route("/taartpuzzel")
 def taartpuzzel():
     """Page to play taartpuzzel"""
-    state = session.get("taartpuzzel", {}).get("state", [""] * 9)
-    return render_template(
-        "taartpuzzel.html", state=state, guess_correct=None, answer=None
+    return cached_page(
+        "taartpuzzel.html",
+        guess_correct=None,
+        answer=None,
+        layout=get_taartpuzzel_layout(),
     )
 
 
 @app.route("/paardensprong")
 def paardensprong():
     """Page to play taartpuzzel"""
-    state = session.get("paardensprong", {}).get("state", [[""] * 3] * 3)
-    return render_template(
-        "paardensprong.html", state=state, guess_correct=None, answer=None
+    return cached_page("paardensprong.html", guess_correct=None, answer=None)
+
+
+@dataclass
+class PreparedPuzzle:
+    """A puzzle with a unique solution, its state and the rendered board"""
+
+    puzzle: Woordpuzzel
+    state: Any
+    html: str
+
+
+def prepare_puzzle(puzzlename: str, puzzle: Woordpuzzel) -> PreparedPuzzle:
+    """Make sure the puzzle has a unique solution, create it and render the board"""
+    with span("uniqueness_check"):
+        if not puzzle.unique_solution():
+            # Only possible for hard mode answers from the database; selecting a new
+            # answer always gives a unique solution
+            logger.warning(
+                "No unique solution for %r, selecting new answer", puzzle.answer
+            )
+            puzzle.select_puzzle()
+
+    with span("puzzle_construction"):
+        state = puzzle.create_puzzle()
+    return render_prepared(puzzlename, puzzle, state)
+
+
+def render_prepared(puzzlename: str, puzzle: Woordpuzzel, state) -> PreparedPuzzle:
+    """Render the board of a puzzle that is already created"""
+    with span("render"):
+        html = BOARDS[puzzlename](state)
+    return PreparedPuzzle(puzzle, state, html)
+
+
+# Modes without side effects, for which puzzles can be created ahead of time
+PUZZLE_FACTORIES: dict[tuple[str, str], Callable[[], Woordpuzzel]] = {
+    ("woordrader", "easy"): lambda: WoordRader(p_wrong=0, p_unknown=0),
+    ("woordrader", "normal"): lambda: WoordRader(p_wrong=0.05, p_unknown=0.05),
+    ("taartpuzzel", "normal"): Taartpuzzel.from_catalogue,
+    ("paardensprong", "normal"): Paardensprong.from_catalogue,
+}
+
+# Modes in which many puzzles are created at once more cheaply than one by one. These
+# puzzles are already created with a unique solution, so are only rendered.
+PUZZLE_BATCH_FACTORIES: dict[tuple[str, str], Callable[[int], list[Woordpuzzel]]] = {
+    ("woordrader", "easy"): lambda n: WoordRader.generate_batch(
+        n, p_wrong=0, p_unknown=0
+    ),
+    ("woordrader", "normal"): lambda n: WoordRader.generate_batch(
+        n, p_wrong=0.05, p_unknown=0.05
+    ),
+}
+
+
+def _create_puzzle_pool(puzzlename: str, mode: str) -> PuzzlePool[PreparedPuzzle]:
+    factory = PUZZLE_FACTORIES[(puzzlename, mode)]
+
+    def prepare() -> PreparedPuzzle:
+        # The background refill needs an app context to render; a miss already has one
+        context = contextlib.nullcontext() if has_app_context() else app.app_context()
+        with context:
+            with span("puzzle_construction"):
+                puzzle = factory()
+            return prepare_puzzle(puzzlename, puzzle)
+
+    batch_factory = PUZZLE_BATCH_FACTORIES.get((puzzlename, mode))
+
+    def prepare_batch(n: int) -> list[PreparedPuzzle]:
+        with app.app_context():
+            with span("puzzle_construction"):
+                puzzles = batch_factory(n)
+            return [
+                render_prepared(puzzlename, puzzle, puzzle.state) for puzzle in puzzles
+            ]
+
+    size = int(os.getenv("PUZZLE_POOL_SIZE", "20"))
+    pool = PuzzlePool(
+        prepare,
+        size=size,
+        # The default threshold would exceed a small or disabled pool
+        refill_threshold=min(
+            size, int(os.getenv("PUZZLE_POOL_REFILL_THRESHOLD", "10"))
+        ),
+        name=f"{puzzlename}-{mode}",
+        batch_factory=None if batch_factory is None else prepare_batch,
     )
+    atexit.register(pool.close)
+    return pool
 
 
-def new_puzzle(puzzlename, puzzleclass, **kwargs):
+def get_puzzle_pool(puzzlename: str, mode: str) -> PuzzlePool[PreparedPuzzle]:
+    """Get the pool of ready puzzles of this worker for a game and mode
+
+    Keeps PUZZLE_POOL_SIZE puzzles ready, and refills when fewer than
+    PUZZLE_POOL_REFILL_THRESHOLD are left. A size of 0 disables the pool.
+    """
+    if (puzzlename, mode) not in PUZZLE_FACTORIES:
+        raise ValueError(f"Unknown mode {mode!r}")
+    return per_worker(
+        f"puzzlepool_{puzzlename}_{mode}",
+        lambda: _create_puzzle_pool(puzzlename, mode),
+    )
+
+
+def new_puzzle(puzzlename: str, prepared: PreparedPuzzle):
     """Base function for creating a new puzzle"""
     playername = request.json.get("playername")
-
-    puzzle = puzzleclass(**kwargs)
-    while not puzzle.unique_solution():
-        puzzle.select_puzzle()
+    puzzle = prepared.puzzle
+    state = prepared.state
 
     puzzle.start_time = datetime.datetime.now()
     data = puzzle.__dict__.copy()
@@ -144,100 +598,44 @@ def new_puzzle(puzzlename, puzzleclass, **kwargs):
     for item in to_eliminate:
         data.pop(item, None)
 
+    data["playername"] = playername
+
     # Since the state for woordrader is more complex, this is written to a
     # different table, for normalized tables
     if puzzlename == "woordrader":
         data.pop("state", None)
-
-    data["playername"] = playername
-
-    gameid = insert_data(f"{puzzlename}.games", data, return_game_id=True)
-
-    session[puzzlename] = {}
-    session[puzzlename]["answer"] = puzzle.answer
-    session[puzzlename]["state"] = puzzle.create_puzzle()
-    session[puzzlename]["gameid"] = gameid
-    session[puzzlename]["active"] = True
-
-    html = render_template(
-        f"{puzzlename}specific.html", state=session[puzzlename]["state"], active=True
+        gameid = insert_woordrader_game(data, state)
+    else:
+        gameid = insert_data(f"{puzzlename}.games", data, return_game_id=True)
+
+    # A new key for every game, so a stale key can not refer to a newer game
+    session.pop(puzzlename, None)
+    save_game(
+        puzzlename,
+        {
+            "puzzle": puzzle,
+            "answer": puzzle.answer,
+            "state": state,
+            "gameid": gameid,
+            "active": True,
+        },
     )
-    return jsonify({"html": html})
+    return jsonify({"html": prepared.html})
 
 
 @app.route("/new_woordrader", methods=["POST"])
 def new_woordrader():
     """Create a new Woordrader puzzle"""
     mode = request.json.get("mode", "normal")
-    if mode == "easy":
-        p_wrong = 0
-        p_unknown = 0
-    elif mode == "normal":
-        p_wrong = 0.05
-        p_unknown = 0.05
-    else:
-        raise ValueError(f"Unknown mode {mode!r}")
-
-    response = new_puzzle(
-        "woordrader", WoordRader, p_wrong=p_wrong, p_unknown=p_unknown
-    )
-
-    database_url = os.getenv("DATABASE_URL")
-    with psycopg.connect(database_url) as conn:  # pylint: disable=not-context-manager
-        with conn.cursor() as cur:
-            letterplacements = tuple(
-                {
-                    "game_id": session["woordrader"]["gameid"],
-                    "position": k + 1,
-                    "shown_letter": v["shown_letter"],
-                    "correct": v["correct"],
-                }
-                for k, v in session["woordrader"]["state"].items()
-            )
-            cur.executemany(
-                """INSERT INTO woordrader.shownletters (
-                    game_id, position, shown_letter, correct
-                ) VALUES (
-                    %(game_id)s, %(position)s, %(shown_letter)s, %(correct)s
-                )""",
-                letterplacements,
-            )
-            conn.commit()
-    return response
+    return new_puzzle("woordrader", get_puzzle_pool("woordrader", mode).get())
 
 
 def select_hard_puzzle(name: str) -> dict:
     """Select a puzzle based on probability of getting it wrong"""
-    database_url = os.getenv("DATABASE_URL")
-    engine = create_engine(database_url.replace("postgresql", "postgresql+psycopg"))
-    with engine.connect() as conn:
-        puzzleoptions = pd.read_sql_table("puzzleoptions", con=conn, schema=name)
-
-    p = probability_option(puzzleoptions["probability"], n=10)
-    chosen_puzzle = puzzleoptions.sample(weights=p).squeeze()
-    logger.debug(p[puzzleoptions["answer"] == chosen_puzzle["answer"]])
-    logger.debug(puzzleoptions[puzzleoptions["answer"] == chosen_puzzle["answer"]])
-    kwargs = {
-        "answer": chosen_puzzle["answer"],
-        "direction": chosen_puzzle["direction"],
-        "startpoint": chosen_puzzle["startpoint"],
-    }
+    # TODO: The puzzle should actually be marked as seen at submit, but that's slightly
+    # harder to implement. And does not seem worth the trouble for now
+    kwargs = get_puzzleoptions(name).sample()
     logger.info(kwargs)
-    # For now, this word will not be played again until there is a full rerun of predictions
-    # Its a bit harsh, but good enough
-    # TODO: This should actually be done at submit, but that's slightly harder to implement
-    # And does not seem worth the trouble for now
-    # pylint: disable=not-context-manager
-    with psycopg.connect(database_url) as conn:
-        with conn.cursor() as cur:
-            query = f"""
-                    UPDATE {name}.puzzleoptions
-                    SET "NTimesWordSeenBefore" = "NTimesWordSeenBefore" + 1,
-                        probability = NULL
-                    WHERE answer = %s;
-            """
-            cur.execute(query, (chosen_puzzle["answer"],))
-            conn.commit()
     return kwargs
 
 
@@ -246,13 +644,13 @@ def new_taartpuzzel():
     """Create a new taartpuzzel"""
     mode = request.json.get("mode", "normal")
     logger.info("New taartpuzzel with mode %s", (mode))
-    if mode == "normal":
-        kwargs = {}
-    elif mode == "hard":
-        kwargs = select_hard_puzzle("taartpuzzel")
+    if mode == "hard":
+        with span("puzzle_construction"):
+            puzzle = Taartpuzzel(**select_hard_puzzle("taartpuzzel"))
+        prepared = prepare_puzzle("taartpuzzel", puzzle)
     else:
-        raise ValueError(f"Unknown mode {mode!r}")
-    return new_puzzle("taartpuzzel", Taartpuzzel, **kwargs)
+        prepared = get_puzzle_pool("taartpuzzel", mode).get()
+    return new_puzzle("taartpuzzel", prepared)
 
 
 @app.route("/new_paardensprong", methods=["POST"])
@@ -260,29 +658,105 @@ def new_paardensprong():
     """Create a new taartpuzzel"""
 
     mode = request.json.get("mode", "normal")
-    if mode == "normal":
-        kwargs = {}
-    elif mode == "hard":
-        kwargs = select_hard_puzzle("paardensprong")
+    if mode == "hard":
+        with span("puzzle_construction"):
+            puzzle = Paardensprong(**select_hard_puzzle("paardensprong"))
+        prepared = prepare_puzzle("paardensprong", puzzle)
     else:
-        raise ValueError(f"Unknown mode {mode!r}")
-    return new_puzzle("paardensprong", Paardensprong, **kwargs)
+        prepared = get_puzzle_pool("paardensprong", mode).get()
+    return new_puzzle("paardensprong", prepared)
+
+
+@app.route("/puzzle_pools")
+def puzzle_pools():
+    """Number of ready puzzles, hits and misses of the puzzle pools of this worker"""
+    pid = os.getpid()
+    return jsonify(
+        {
+            name.removeprefix("puzzlepool_"): pool.stats()
+            for (owner, name), pool in list(_WORKER_RESOURCES.items())
+            if owner == pid and name.startswith("puzzlepool_")
+        }
+    )
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Request and span durations of this worker in the Prometheus text format"""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
+# The games that can be shown as image, and the columns to recreate a game from
+IMAGE_GAMES: dict[str, tuple[type, tuple[str, ...]]] = {
+    "taartpuzzel": (
+        Taartpuzzel,
+        ("answer", "startpoint", "direction", "missing_letter_index"),
+    ),
+    "paardensprong": (Paardensprong, ("answer", "startpoint", "direction")),
+}
+IMAGE_MAX_AGE = int(os.getenv("IMAGE_MAX_AGE", "86400"))
+
+
+def get_image_cache() -> RenderedImageCache:
+    """Get the cache of rendered puzzle images of this worker"""
+    return per_worker(
+        "image_cache",
+        lambda: RenderedImageCache(int(os.getenv("IMAGE_CACHE_SIZE", "256"))),
+    )
+
+
+def load_puzzle(puzzlename: str, game_id: int) -> Woordpuzzel:
+    """Recreate a played game from the database, or abort with 404 if it is unknown"""
+    puzzleclass, columns = IMAGE_GAMES[puzzlename]
+    query = f"SELECT {', '.join(columns)} FROM {puzzlename}.games WHERE game_id = %s;"
+    with db_connection() as conn, span("db_execute"):
+        with conn.cursor() as cur:
+            cur.execute(query, (game_id,))
+            row = cur.fetchone()
+    if row is None:
+        abort(404, f"No {puzzlename} game {game_id}")
+    with span("puzzle_construction"):
+        return puzzleclass(**dict(zip(columns, row)))
+
+
+@app.route("/image/<puzzlename>/<int:game_id>")
+def puzzle_image(puzzlename: str, game_id: int):
+    """The board of a played game as PNG, or as WebP with `?format=webp`"""
+    if puzzlename not in IMAGE_GAMES:
+        abort(404, f"No images for {puzzlename}")
+    image_format = request.args.get("format", "png")
+    if image_format not in IMAGE_FORMATS:
+        abort(400, f"Unknown image format {image_format!r}")
+    puzzle = load_puzzle(puzzlename, game_id)
+    with span("render"):
+        etag, image = get_image_cache().get(
+            puzzlename, puzzle.create_puzzle(), image_format
+        )
+    response = Response(image, content_type=IMAGE_FORMATS[image_format][1])
+    response.set_etag(etag)
+    response.cache_control.max_age = IMAGE_MAX_AGE
+    response.cache_control.public = True
+    return response.make_conditional(request)
 
 
 def handle_guess(puzzlename):
     """Base function for handling submitted guesses"""
     guess_input = request.json.get("guess")
-    answer = session[puzzlename]["answer"]
+    game = load_game(puzzlename)
+    if game is None:
+        abort(404, "No game in progress")
+    answer = game["answer"]
     correct = is_guess_correct(guess_input, answer)
     data = {
-        "game_id": session[puzzlename]["gameid"],
+        "game_id": game["gameid"],
         "guess_time": datetime.datetime.now(),
         "guess": guess_input,
         "correct": correct,
     }
-    insert_data(f"{puzzlename}.guesses", data)
+    get_event_writer().write(f"{puzzlename}.guesses", data)
 
-    session[puzzlename]["active"] = False
+    game["active"] = False
+    save_game(puzzlename, game)
     return jsonify({"answer": answer, "correct": correct})
 
 
@@ -306,19 +780,32 @@ def guess_paardensprong():
 
 @app.route("/buy_letter", methods=["POST"])
 def buy_letter():
-    """Handle buy letter request"""
-    data = request.json
-    quizposition = data.get("quizposition")
-    session["woordrader"]["state"][quizposition]["bought"] = True
+    """Handle buy letter request
+
+    Only returns where the bought letter lands in the bottom row and what is shown
+    there: the true letter, or "?" if the shown letter was wrong
+    """
+    try:
+        quizposition = int(request.json["quizposition"])
+    except (KeyError, TypeError, ValueError):
+        abort(400, "quizposition must be a number")
+    game = load_game("woordrader")
+    if game is None:
+        abort(404, "No game in progress")
+    try:
+        answer_position, letter = game["puzzle"].buy_letter(quizposition + 1)
+    except ValueError as e:
+        abort(400, str(e))
+    save_game("woordrader", game)
 
     data = {
-        "game_id": session["woordrader"]["gameid"],
+        "game_id": game["gameid"],
         "letterposition": quizposition,
         "buytime": datetime.datetime.now(),
     }
-    insert_data("woordrader.boughtletters", data)
+    get_event_writer().write("woordrader.boughtletters", data)
 
-    return jsonify(session["woordrader"]["state"])
+    return jsonify({"answer_position": answer_position, "letter": letter})
 
 
 if __name__ == "__main__":
@@ -0,0 +1,407 @@
+"""Load test of the app: replay sessions of concurrent players against gunicorn workers
+
+Starts the app with gunicorn against a database, lets `--concurrency` players play games
+(open the page, start a new game, buy letters for woordrader and guess) for `--duration`
+seconds and reports the latency percentiles and throughput per endpoint as JSON.
+
+The database is one of
+- sqlite: a SQLite file per worker standing in for Postgres (see `benchmarks.standin`);
+  runs anywhere, but does not measure the database
+- postgres: the Postgres database at `--database-url`, or else a throwaway database
+  created with `initdb` and `pg_ctl` (which must be on the PATH, or in `--pg-bin`)
+
+Run from the root of the repository, e.g.
+    python -m benchmarks.loadtest --workers 4 --concurrency 16 --output before.json
+    python -m benchmarks.loadtest --workers 4 --concurrency 16 --compare before.json
+"""
+
+import argparse
+import contextlib
+import glob
+import http.cookiejar
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, Iterator, List, Optional
+
+from benchmarks.report import (
+    ROOT,
+    add_report_arguments,
+    create_report,
+    format_change,
+    load_report,
+    publish_report,
+)
+
+DDL_DIR = os.path.join(ROOT, "tweevoortwaalf", "DDL")
+GAMES = ("woordrader", "taartpuzzel", "paardensprong")
+PERCENTILES = (50, 95, 99)
+_TOP_ROW_CELL = re.compile(r'id="upperrow-(\d+)"')
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """The nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, round(pct / 100 * len(sorted_values) + 0.5 - 1e-9))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    """Collect the latency and status of every request per endpoint"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float, error: Optional[str]) -> None:
+        """Add a request, with the HTTP status or exception if it failed"""
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if error is not None:
+                errors = self.errors.setdefault(endpoint, {})
+                errors[error] = errors.get(error, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict[str, dict]:
+        """Count, errors, throughput and latency percentiles (in ms) per endpoint"""
+        result = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            result[endpoint] = {
+                "count": len(latencies),
+                "errors": sum(self.errors.get(endpoint, {}).values()),
+                "error_reasons": self.errors.get(endpoint, {}),
+                "throughput": len(latencies) / elapsed,
+                "mean_ms": 1000 * sum(latencies) / len(latencies),
+                **{
+                    f"p{pct}_ms": 1000 * percentile(latencies, pct)
+                    for pct in PERCENTILES
+                },
+            }
+        return result
+
+
+# pylint: disable=too-few-public-methods
+class Player:
+    """A player with its own cookies, who plays games until the deadline"""
+
+    def __init__(
+        self, base_url: str, recorder: Recorder, rng: random.Random, args
+    ):  # pylint: disable=too-many-arguments
+        self.base_url = base_url
+        self.recorder = recorder
+        self.rng = rng
+        self.args = args
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def request(self, path: str, payload: Optional[dict] = None):
+        """Do a request and record it; returns the body, or None if it failed"""
+        data = None if payload is None else json.dumps(payload).encode()
+        req = urllib.request.Request(
+            self.base_url + path,
+            data=data,
+            headers={"Content-Type": "application/json"} if data else {},
+        )
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.args.timeout) as response:
+                body = response.read()
+            error = None
+        except urllib.error.HTTPError as e:
+            body, error = None, str(e.code)
+        except (urllib.error.URLError, OSError) as e:
+            body, error = None, type(e).__name__
+        endpoint = f"{'POST' if data else 'GET'} {path}"
+        self.recorder.record(endpoint, time.perf_counter() - start, error)
+        return body
+
+    def play(self, game: str) -> None:
+        """Play a single game: open the page, start a game, buy letters and guess"""
+        mode = self.rng.choice(self.args.modes[game])
+        if self.rng.random() < self.args.page_views:
+            self.request(f"/{game}")
+        body = self.request(f"/new_{game}", {"playername": "loadtest", "mode": mode})
+        if body is None:
+            return
+        if game == "woordrader":
+            cells = _TOP_ROW_CELL.findall(json.loads(body)["html"])
+            for cell in self.rng.sample(cells, min(self.args.buy_letters, len(cells))):
+                self.request("/buy_letter", {"quizposition": cell})
+        self.request(f"/guess_{game}", {"guess": "loadtest"})
+
+    def run(self, deadline: float) -> None:
+        """Keep playing random games until the deadline"""
+        while time.monotonic() < deadline:
+            self.play(self.rng.choice(self.args.games))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(base_url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn stopped before it was ready")
+        with contextlib.suppress(urllib.error.URLError, OSError):
+            with urllib.request.urlopen(base_url + "/", timeout=1):
+                return
+        time.sleep(0.2)
+    raise TimeoutError(f"App did not start within {timeout} seconds")
+
+
+def create_tables(database_url: str) -> None:
+    """Create the tables of all games, if they do not exist"""
+    import psycopg  # pylint: disable=import-outside-toplevel
+
+    with psycopg.connect(database_url, autocommit=True) as conn:
+        for game in GAMES:
+            with open(os.path.join(DDL_DIR, f"{game}.sql"), encoding="utf-8") as f:
+                conn.execute(f.read())
+
+
+@contextlib.contextmanager
+def throwaway_postgres(pg_bin: Optional[str], tmpdir: str) -> Iterator[str]:
+    """Run a temporary Postgres server on a Unix socket and yield its URL"""
+
+    def executable(name: str) -> str:
+        path = os.path.join(pg_bin, name) if pg_bin else shutil.which(name)
+        if not path or not os.path.exists(path):
+            raise FileNotFoundError(
+                f"{name} not found; put it on the PATH, pass --pg-bin or --database-url"
+            )
+        return path
+
+    datadir = os.path.join(tmpdir, "pgdata")
+    subprocess.run(
+        [executable("initdb"), "-D", datadir, "-U", "postgres", "--auth=trust"],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    pg_ctl = executable("pg_ctl")
+    subprocess.run(
+        [
+            pg_ctl,
+            "start",
+            "-w",
+            "-D",
+            datadir,
+            "-l",
+            os.path.join(tmpdir, "postgres.log"),
+            "-o",
+            f"-k {tmpdir} -c listen_addresses=''",
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        yield f"postgresql://postgres@/postgres?host={tmpdir}"
+    finally:
+        subprocess.run(
+            [pg_ctl, "stop", "-m", "fast", "-D", datadir],
+            check=False,
+            stdout=subprocess.DEVNULL,
+        )
+
+
+@contextlib.contextmanager
+def running_app(args, tmpdir: str) -> Iterator[str]:
+    """Start the app with gunicorn and yield its URL"""
+    env = dict(os.environ)
+    env.setdefault("FLASK_SECRET_KEY", "loadtest")
+    if args.workers > 1:
+        # Games in memory are only visible to the worker that created them
+        env["GAME_STATE_STORE"] = "sqlite"
+        env["GAME_STATE_PATH"] = os.path.join(tmpdir, "gamestate.sqlite")
+
+    with contextlib.ExitStack() as stack:
+        if args.backend == "sqlite":
+            env["BENCHMARK_SQLITE_DIR"] = tmpdir
+            module = "benchmarks.standin:app"
+        else:
+            database_url = args.database_url or stack.enter_context(
+                throwaway_postgres(args.pg_bin, tmpdir)
+            )
+            create_tables(database_url)
+            env["DATABASE_URL"] = database_url
+            module = "app:app"
+
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        with open(os.path.join(tmpdir, "gunicorn.log"), "wb") as log:
+            process = subprocess.Popen(  # pylint: disable=consider-using-with
+                [
+                    sys.executable,
+                    "-m",
+                    "gunicorn",
+                    "--workers",
+                    str(args.workers),
+                    "--threads",
+                    str(args.threads),
+                    "--bind",
+                    f"127.0.0.1:{port}",
+                    module,
+                ],
+                cwd=ROOT,
+                env=env,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+        try:
+            _wait_until_up(base_url, process, args.startup_timeout)
+            yield base_url
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+def run_players(base_url: str, args, duration: float) -> dict:
+    """Let `args.concurrency` players play for `duration` seconds"""
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+    players = [
+        Player(base_url, recorder, random.Random(args.seed + i), args)
+        for i in range(args.concurrency)
+    ]
+    threads = [
+        threading.Thread(target=player.run, args=(deadline,)) for player in players
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    endpoints = recorder.summary(elapsed)
+    total = sum(endpoint["count"] for endpoint in endpoints.values())
+    return {
+        "elapsed_seconds": elapsed,
+        "requests": total,
+        "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+        "throughput": total / elapsed,
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report: dict, baseline: Optional[dict] = None) -> None:
+    """Print a table of the results (and the change from a baseline) to stderr"""
+    header = f"{'endpoint':<28}{'count':>7}{'err':>5}{'req/s':>8}"
+    header += "".join(f"{f'p{pct} ms':>10}" for pct in PERCENTILES)
+    if baseline:
+        header += f"{'p95 vs base':>13}"
+    print(header, file=sys.stderr)
+    for endpoint, stats in report["results"]["endpoints"].items():
+        line = f"{endpoint:<28}{stats['count']:>7}{stats['errors']:>5}"
+        line += f"{stats['throughput']:>8.1f}"
+        line += "".join(f"{stats[f'p{pct}_ms']:>10.1f}" for pct in PERCENTILES)
+        base = (baseline or {}).get("results", {}).get("endpoints", {}).get(endpoint)
+        if base:
+            line += format_change(stats["p95_ms"], base["p95_ms"], 13)
+        print(line, file=sys.stderr)
+    results = report["results"]
+    print(
+        f"{results['requests']} requests, {results['errors']} errors, "
+        f"{results['throughput']:.1f} req/s",
+        file=sys.stderr,
+    )
+
+
+def parse_args(argv=None):
+    """Parse the command line"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["sqlite", "postgres"], default="sqlite")
+    parser.add_argument(
+        "--database-url", help="Existing Postgres database (postgres backend)"
+    )
+    parser.add_argument(
+        "--pg-bin", help="Directory with initdb and pg_ctl for a throwaway Postgres"
+    )
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=1, help="Threads per worker")
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="Simultaneous players"
+    )
+    parser.add_argument("--duration", type=float, default=30, help="Seconds")
+    parser.add_argument(
+        "--warmup", type=float, default=5, help="Seconds to play before measuring"
+    )
+    parser.add_argument("--games", default=",".join(GAMES), help="Games to play")
+    parser.add_argument(
+        "--hard",
+        action="store_true",
+        help="Also play hard mode (needs the puzzle options in Postgres)",
+    )
+    parser.add_argument(
+        "--buy-letters", type=int, default=3, help="Letters to buy per woordrader game"
+    )
+    parser.add_argument(
+        "--page-views",
+        type=float,
+        default=0.2,
+        help="Fraction of games for which the page is opened first",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=30, help="Request timeout")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    add_report_arguments(parser)
+    args = parser.parse_args(argv)
+
+    args.games = args.games.split(",")
+    unknown = set(args.games) - set(GAMES)
+    if unknown:
+        parser.error(f"Unknown games: {', '.join(sorted(unknown))}")
+    if args.hard and args.backend == "sqlite":
+        parser.error("Hard mode needs the postgres backend")
+    args.modes = {
+        "woordrader": ["easy", "normal"],
+        "taartpuzzel": ["normal", "hard"] if args.hard else ["normal"],
+        "paardensprong": ["normal", "hard"] if args.hard else ["normal"],
+    }
+    return args
+
+
+def main(argv=None) -> dict:
+    """Run the load test and write the report"""
+    args = parse_args(argv)
+    # Read first, so a wrong path does not fail after the load test ran
+    baseline = load_report(args.compare)
+    with tempfile.TemporaryDirectory(prefix="tweevoortwaalf-loadtest-") as tmpdir:
+        with running_app(args, tmpdir) as base_url:
+            if args.warmup > 0:
+                run_players(base_url, args, args.warmup)
+            results = run_players(base_url, args, args.duration)
+        for log in glob.glob(os.path.join(tmpdir, "*.log")):
+            if results["errors"]:
+                with open(log, encoding="utf-8", errors="replace") as f:
+                    sys.stderr.write(f.read()[-5000:])
+
+    report = create_report(
+        {
+            key: value
+            for key, value in vars(args).items()
+            if key not in {"output", "compare", "database_url"}
+        },
+        results,
+    )
+    return publish_report(report, baseline, args.output, print_report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""Microbenchmarks of puzzle generation, uniqueness checks and word list selection
+
+Every benchmark is run with the same random seed, after one warm up call so the shared
+word stores and indexes are loaded. Reports operations per second (best and median of
+`--repeat` runs) and the memory allocated per operation, measured with tracemalloc.
+
+Run from the root of the repository, e.g.
+    python -m benchmarks.microbench --output before.json
+    python -m benchmarks.microbench --filter woordrader --compare before.json
+"""
+
+import argparse
+import itertools
+import random
+import re
+import statistics
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.report import (
+    add_report_arguments,
+    create_report,
+    format_change,
+    load_report,
+    publish_report,
+)
+from tweevoortwaalf import suitablewordselection
+from tweevoortwaalf.paardensprong import Paardensprong
+from tweevoortwaalf.puzzleimages import PaardensprongImageGenerator, TaartpuzzleImage
+from tweevoortwaalf.taartpuzzel import Taartpuzzel
+from tweevoortwaalf.woordrader import WoordRader, generate_starting_positions
+from tweevoortwaalf.wordindex import (
+    AnagramIndex,
+    RotationIndex,
+    WildcardRotationIndex,
+    canonical_rotation,
+    get_anagram_index,
+)
+from tweevoortwaalf.wordstore import get_wordstore
+
+# A setup function returns the operation to time
+Setup = Callable[[], Callable[[], Any]]
+BENCHMARKS: Dict[str, Setup] = {}
+
+
+def benchmark(name: str) -> Callable[[Setup], Setup]:
+    """Register a setup function as benchmark `name`"""
+
+    def register(setup: Setup) -> Setup:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def seed_all(seed: int) -> None:
+    """Seed all random number generators the puzzles use"""
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+@benchmark("paardensprong.construct")
+def paardensprong_construct():
+    """A new puzzle, including selecting the answer"""
+    return Paardensprong
+
+
+@benchmark("paardensprong.from_catalogue")
+def paardensprong_from_catalogue():
+    """A new puzzle from the precomputed catalogue"""
+    return Paardensprong.from_catalogue
+
+
+@benchmark("paardensprong.unique_solution")
+def paardensprong_unique_solution():
+    """Check the uniqueness of a puzzle"""
+    return Paardensprong().unique_solution
+
+
+@benchmark("paardensprong.create_puzzle")
+def paardensprong_create_puzzle():
+    """Place the letters of a puzzle"""
+    return Paardensprong().create_puzzle
+
+
+@benchmark("taartpuzzel.construct")
+def taartpuzzel_construct():
+    """A new puzzle, including selecting the answer"""
+    return Taartpuzzel
+
+
+@benchmark("taartpuzzel.from_catalogue")
+def taartpuzzel_from_catalogue():
+    """A new puzzle from the precomputed catalogue"""
+    return Taartpuzzel.from_catalogue
+
+
+@benchmark("taartpuzzel.unique_solution")
+def taartpuzzel_unique_solution():
+    """Check the uniqueness of a puzzle"""
+    return Taartpuzzel().unique_solution
+
+
+@benchmark("taartpuzzel.create_puzzle")
+def taartpuzzel_create_puzzle():
+    """Place the letters of a puzzle"""
+    return Taartpuzzel().create_puzzle
+
+
+@benchmark("woordrader.construct")
+def woordrader_construct():
+    """A new puzzle in normal mode, including a unique starting position"""
+    return lambda: WoordRader(p_wrong=0.05, p_unknown=0.05)
+
+
+@benchmark("woordrader.construct_easy")
+def woordrader_construct_easy():
+    """A new puzzle in easy mode: all letters shown and correct"""
+    return lambda: WoordRader(p_wrong=0, p_unknown=0)
+
+
+@benchmark("woordrader.unique_solution")
+def woordrader_unique_solution():
+    """Check whether another word fits the correctly shown letters"""
+    return WoordRader(p_wrong=0.05, p_unknown=0.05).unique_solution
+
+
+@benchmark("woordrader.create_puzzle")
+def woordrader_create_puzzle():
+    """Generate a new unique starting position"""
+    return WoordRader(p_wrong=0.05, p_unknown=0.05).create_puzzle
+
+
+@benchmark("woordrader.generate_batch_100")
+def woordrader_generate_batch_100():
+    """100 new puzzles in normal mode, with their starting positions made at once"""
+    return lambda: WoordRader.generate_batch(100, p_wrong=0.05, p_unknown=0.05)
+
+
+@benchmark("woordrader.starting_positions_1000")
+def woordrader_starting_positions_1000():
+    """1000 starting positions as arrays, without the uniqueness checks"""
+    answers = get_anagram_index(12).unique_words[:1000]
+    return lambda: generate_starting_positions(answers, p_wrong=0.05, p_unknown=0.05)
+
+
+@benchmark("woordrader.get_top_row")
+def woordrader_get_top_row():
+    """The top row of a puzzle with a third of the letters bought"""
+    puzzle = WoordRader(p_wrong=0.05, p_unknown=0.05)
+    for position in range(1, puzzle.n_letters + 1, 3):
+        puzzle.buy_letter(position)
+    return puzzle.get_top_row
+
+
+@benchmark("woordrader.get_bottom_row")
+def woordrader_get_bottom_row():
+    """The bottom row of a puzzle with a third of the letters bought"""
+    puzzle = WoordRader(p_wrong=0.05, p_unknown=0.05)
+    for position in range(1, puzzle.n_letters + 1, 3):
+        puzzle.buy_letter(position)
+    return puzzle.get_bottom_row
+
+
+@benchmark("woordrader.buy_letter")
+def woordrader_buy_letter():
+    """Buy a single letter; all letters are sold again after the last one"""
+    puzzle = WoordRader(p_wrong=0.05, p_unknown=0.05)
+    positions = itertools.cycle(range(1, puzzle.n_letters + 1))
+
+    def buy():
+        position = next(positions)
+        if position == 1:
+            puzzle.state.bought = 0
+        return puzzle.buy_letter(position)
+
+    return buy
+
+
+@benchmark("images.taartpuzzel")
+def images_taartpuzzel():
+    """Generate the image of a taartpuzzel"""
+    layout = Taartpuzzel.from_catalogue().create_puzzle()
+    return lambda: TaartpuzzleImage(layout).generate_image()
+
+
+@benchmark("images.paardensprong")
+def images_paardensprong():
+    """Generate the image of a paardensprong"""
+    layout = Paardensprong.from_catalogue().create_puzzle()
+    return lambda: PaardensprongImageGenerator(layout).generate_image()
+
+
+@benchmark("index.rotation_8")
+def index_rotation_8():
+    """Build the rotation index of the 8 letter words"""
+    wordstore = get_wordstore(8)
+    return lambda: RotationIndex(wordstore)
+
+
+@benchmark("index.wildcard_rotation_9")
+def index_wildcard_rotation_9():
+    """Build the wildcard rotation index of the 9 letter words"""
+    wordstore = get_wordstore(9)
+    return lambda: WildcardRotationIndex(wordstore)
+
+
+@benchmark("index.anagram_12")
+def index_anagram_12():
+    """Build the anagram index of the 12 letter words"""
+    wordstore = get_wordstore(12)
+    return lambda: AnagramIndex(12, wordstore.words)
+
+
+@benchmark("suitablewordselection.generate_rotations")
+def generate_rotations():
+    """All rotations of a 9 letter word"""
+    return lambda: suitablewordselection.generate_rotations("taartvorm")
+
+
+@benchmark("suitablewordselection.remove_rotated_duplicates_8")
+def remove_rotated_duplicates_8():
+    """Remove the rotated duplicates from all 8 letter words"""
+    series = pd.Series(get_wordstore(8).words)
+    return lambda: suitablewordselection.remove_rotated_duplicates(series)
+
+
+@benchmark("suitablewordselection.remove_rotated_duplicates_9")
+def remove_rotated_duplicates_9():
+    """Remove the rotated duplicates from all 9 letter words"""
+    series = pd.Series(get_wordstore(9).words)
+    return lambda: suitablewordselection.remove_rotated_duplicates(series)
+
+
+@benchmark("suitablewordselection.remove_anagrams_12")
+def remove_anagrams_12():
+    """Remove the anagrams from all 12 letter words"""
+    series = pd.Series(get_wordstore(12).words)
+    return lambda: suitablewordselection.remove_anagrams(series)
+
+
+@benchmark("index.canonical_rotation")
+def index_canonical_rotation():
+    """The smallest rotation of a 9 letter word"""
+    return lambda: canonical_rotation("taartvorm")
+
+
+@benchmark("suitablewordselection.word_list_chunk")
+def word_list_chunk():
+    """Add a chunk of all suitable 8, 9 and 12 letter words to a word list builder"""
+    words = np.concatenate([get_wordstore(n).words for n in (8, 9, 12)])
+    chunk = pd.DataFrame(
+        {"Word": words, "Length": [len(word) for word in words]}
+    ).assign(**{col: True for col in suitablewordselection.SUITABILITY_COLS})
+    return lambda: suitablewordselection.WordListBuilder().add(chunk)
+
+
+def measure_allocations(operation: Callable[[], Any], number: int) -> dict:
+    """Memory allocated while running `operation` `number` times
+
+    Returns the peak of traced memory above the start (the working memory of a call)
+    and the memory still allocated afterwards, per call (e.g. growing caches)
+    """
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for _ in range(number):
+            operation()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "peak_bytes": peak - start,
+        "retained_bytes_per_op": (current - start) / number,
+    }
+
+
+def run_benchmark(setup: Setup, seed: int, repeat: int, min_time: float) -> dict:
+    """Time an operation and measure its allocations"""
+    seed_all(seed)
+    operation = setup()
+    # Loads the word stores, indexes and catalogues
+    operation()
+
+    timer = timeit.Timer(operation)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    timings = []
+    for _ in range(repeat):
+        seed_all(seed)
+        timings.append(timer.timeit(number) / number)
+
+    seed_all(seed)
+    return {
+        "number": number,
+        "ops_per_sec": 1 / min(timings),
+        "median_ops_per_sec": 1 / statistics.median(timings),
+        "best_us": 1e6 * min(timings),
+        **measure_allocations(operation, min(number, 100)),
+    }
+
+
+def print_report(report: dict, baseline: Optional[dict] = None) -> None:
+    """Print a table of the results (and the change from a baseline) to stderr"""
+    header = f"{'benchmark':<50}{'ops/s':>12}{'best us':>12}{'peak KiB':>10}"
+    if baseline:
+        header += f"{'ops/s vs base':>15}"
+    print(header, file=sys.stderr)
+    for name, result in report["results"].items():
+        line = f"{name:<50}{result['ops_per_sec']:>12.1f}{result['best_us']:>12.1f}"
+        line += f"{result['peak_bytes'] / 1024:>10.1f}"
+        base = (baseline or {}).get("results", {}).get(name)
+        if base:
+            line += format_change(result["ops_per_sec"], base["ops_per_sec"], 15)
+        print(line, file=sys.stderr)
+
+
+def main(argv=None) -> dict:
+    """Run the benchmarks and write the report"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", default="", help="Regex of benchmarks to run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs")
+    parser.add_argument(
+        "--min-time", type=float, default=0.2, help="Minimal seconds per timed run"
+    )
+    parser.add_argument("--list", action="store_true", help="Only list benchmarks")
+    add_report_arguments(parser)
+    args = parser.parse_args(argv)
+
+    # Read first, so a wrong path does not fail after all benchmarks ran
+    baseline = load_report(args.compare)
+    selected = {
+        name: setup
+        for name, setup in BENCHMARKS.items()
+        if re.search(args.filter, name)
+    }
+    if args.list:
+        for name, setup in selected.items():
+            print(f"{name:<50}{setup.__doc__}")
+        return {}
+
+    results = {}
+    for name, setup in selected.items():
+        print(f"Running {name}", file=sys.stderr)
+        results[name] = run_benchmark(setup, args.seed, args.repeat, args.min_time)
+
+    config = {"seed": args.seed, "repeat": args.repeat, "min_time": args.min_time}
+    report = create_report(config, results)
+    return publish_report(report, baseline, args.output, print_report)
+
+
+if __name__ == "__main__":
+    main()
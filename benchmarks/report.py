@@ -0,0 +1,79 @@
+"""JSON reports of benchmark runs, so results can be compared between versions"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+from typing import Any, Callable, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git_commit() -> Optional[str]:
+    """The commit of the repository that is benchmarked, if known"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def create_report(config: dict, results: Any) -> dict:
+    """The results with the configuration and the version and platform they ran on"""
+    return {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "results": results,
+    }
+
+
+def load_report(path: Optional[str]) -> Optional[dict]:
+    """Read an earlier report, or None if there is no path"""
+    if not path:
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_report(report: dict, path: Optional[str]) -> None:
+    """Write the report to `path`, or to stdout if there is no path"""
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+def add_report_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the options to write the report to a file and to compare to an earlier one"""
+    parser.add_argument("--output", help="Write the JSON report here, not to stdout")
+    parser.add_argument("--compare", help="JSON report of an earlier run to compare to")
+
+
+def format_change(value: float, base: float, width: int) -> str:
+    """The relative change from `base` to `value`, right aligned in `width` characters"""
+    return f"{value / base - 1:>+{width}.1%}"
+
+
+def publish_report(
+    report: dict,
+    baseline: Optional[dict],
+    path: Optional[str],
+    print_table: Callable[[dict, Optional[dict]], None],
+) -> dict:
+    """Print the table of the report to stderr and write the report, returns it"""
+    print_table(report, baseline)
+    write_report(report, path)
+    return report
@@ -0,0 +1,131 @@
+"""The app with a local SQLite database standing in for Postgres
+
+For load tests without a Postgres server. Games, guesses and bought letters are written
+to a SQLite file per worker (in BENCHMARK_SQLITE_DIR) with the same contract as the
+Postgres functions in app.py: `insert_data` returns the new game_id when asked, and
+events are written in the background. Hard mode needs the Postgres puzzle options, so
+is not available.
+
+Run with gunicorn from the root of the repository: `gunicorn benchmarks.standin:app`
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+
+import app as tweevoortwaalf_app
+from tweevoortwaalf.woordrader import WoordRaderState
+
+app = tweevoortwaalf_app.app
+
+
+def _table(table_name: str) -> str:
+    return table_name.replace(".", "_")
+
+
+class SQLiteStandIn:
+    """Writes all rows as JSON to a table per Postgres table
+
+    Parameters
+    ----------
+    path : str
+        The SQLite file to write to, created if it does not exist
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._tables: set = set()
+        self._lock = threading.Lock()
+        self._events: queue.SimpleQueue = queue.SimpleQueue()
+        threading.Thread(target=self._write_events, daemon=True).start()
+
+    def _connection(self) -> sqlite3.Connection:
+        if not hasattr(self._local, "conn"):
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return self._local.conn
+
+    def _insert(self, table_name: str, data: dict) -> int:
+        table = _table(table_name)
+        conn = self._connection()
+        if table not in self._tables:
+            with self._lock:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} "
+                    "(row_id INTEGER PRIMARY KEY, data TEXT NOT NULL)"
+                )
+                self._tables.add(table)
+        cur = conn.execute(
+            f"INSERT INTO {table} (data) VALUES (?)", (json.dumps(data, default=str),)
+        )
+        return cur.lastrowid
+
+    def insert_data(
+        self, table_name: str, data: dict, return_game_id=False
+    ) -> int | None:
+        """Write a row, see `app.insert_data`"""
+        game_id = self._insert(table_name, data)
+        return game_id if return_game_id else None
+
+    def insert_woordrader_game(self, data: dict, state: WoordRaderState) -> int:
+        """Write a woordrader game and its shown letters, see `app.insert_woordrader_game`"""
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            game_id = self._insert("woordrader.games", data)
+            for quizposition, shown_letter in enumerate(state.shown):
+                self._insert(
+                    "woordrader.shownletters",
+                    {
+                        "game_id": game_id,
+                        "position": quizposition + 1,
+                        "shown_letter": shown_letter,
+                        "correct": state.is_correct(quizposition),
+                    },
+                )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return game_id
+
+    def write(self, table: str, data: dict) -> None:
+        """Queue an event, see `EventWriter.write`"""
+        self._events.put((table, data))
+
+    def _write_events(self) -> None:
+        while True:
+            self._insert(*self._events.get())
+
+
+def get_standin() -> SQLiteStandIn:
+    """Get the stand-in database of this worker"""
+    directory = os.getenv("BENCHMARK_SQLITE_DIR", tempfile.gettempdir())
+    return tweevoortwaalf_app.per_worker(
+        "sqlite_standin",
+        lambda: SQLiteStandIn(
+            os.path.join(directory, f"tweevoortwaalf-{os.getpid()}.sqlite")
+        ),
+    )
+
+
+def insert_data(*args, **kwargs):
+    """`app.insert_data`, writing to the stand-in of this worker"""
+    return get_standin().insert_data(*args, **kwargs)
+
+
+def insert_woordrader_game(*args, **kwargs):
+    """`app.insert_woordrader_game`, writing to the stand-in of this worker"""
+    return get_standin().insert_woordrader_game(*args, **kwargs)
+
+
+# The routes look these up when they are called, so all writes go to the stand-in
+tweevoortwaalf_app.insert_data = insert_data
+tweevoortwaalf_app.insert_woordrader_game = insert_woordrader_game
+tweevoortwaalf_app.get_event_writer = get_standin
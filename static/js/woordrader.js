@@ -30,11 +30,9 @@ function buyLetter(quizposition) {
         .then(response => response.json())
         .then(data => {
             const cellUpperRow = document.getElementById(`upperrow-${quizposition}`);
-            const cellLowerRow = document.getElementById(`lowerrow-${data[quizposition].answer_position}`);
-            const letterData = data[quizposition];
+            const cellLowerRow = document.getElementById(`lowerrow-${data.answer_position}`);
 
             cellUpperRow.textContent = "";
-            const letter = capitalizeLetterExceptI(letterData.true_letter)
-            cellLowerRow.textContent = letterData.correct ? letter : "?";
+            cellLowerRow.textContent = capitalizeLetterExceptI(data.letter);
         });
 }
@@ -0,0 +1,23 @@
+"""The difficulty table only has answers for which games could be simulated"""
+
+from tweevoortwaalf.difficulty import TABLE_COLUMNS, difficulty_table
+from tweevoortwaalf.wordindex import get_anagram_index
+
+
+def test_answer_without_unique_starting_position_is_left_out():
+    """Without correctly shown letters, no game has a unique starting position"""
+    answers = get_anagram_index(12).unique_words[:2].tolist()
+    table = difficulty_table(answers, [(0.0, 1.0), (0.0, 0.0)], n_games=3, processes=1)
+    assert list(table.columns) == TABLE_COLUMNS
+    assert (table["p_unknown"] == 0).all()
+    assert sorted(table["answer"]) == sorted(answers)
+    assert table.notna().all(axis=None)
+    assert (table["n_games"] == 3).all()
+
+
+def test_no_games_gives_empty_table():
+    """The table can still be written"""
+    answers = get_anagram_index(12).unique_words[:1].tolist()
+    table = difficulty_table(answers, [(0.0, 1.0)], n_games=2, processes=1)
+    assert table.empty
+    assert list(table.columns) == TABLE_COLUMNS
@@ -0,0 +1,81 @@
+"""Events are only dropped when they can never be written"""
+
+import json
+import os
+
+import psycopg
+import pytest
+
+from tweevoortwaalf.eventwriter import EventWriter
+
+
+class FlakyEventWriter(EventWriter):
+    """Fails to insert the events for which `failures` has an error"""
+
+    def __init__(self, spill_dir: str, failures: dict):
+        super().__init__(None, str(spill_dir))
+        self.failures = failures
+        self.written = []
+
+    def _insert(self, batch):
+        if len(batch) > 1:
+            # A single invalid row makes the whole batch fail
+            for _, data in batch:
+                if data["id"] in self.failures:
+                    raise psycopg.DataError("invalid row in batch")
+        for _, data in batch:
+            if data["id"] in self.failures:
+                raise self.failures[data["id"]]
+        self.written.extend(data["id"] for _, data in batch)
+
+
+def _spilled(writer: EventWriter) -> list:
+    with open(writer.spill_path, encoding="utf-8") as f:
+        return [json.loads(line)[1]["id"] for line in f]
+
+
+@pytest.fixture(name="make_writer")
+def fixture_make_writer(tmp_path):
+    """Create writers that spill to `tmp_path`, and stop them afterwards"""
+    writers = []
+
+    def make_writer(failures: dict) -> FlakyEventWriter:
+        writer = FlakyEventWriter(tmp_path, failures)
+        writers.append(writer)
+        return writer
+
+    yield make_writer
+    for writer in writers:
+        writer.close()
+
+
+def _events(n: int) -> list:
+    return [("woordrader.guesses", {"id": i}) for i in range(n)]
+
+
+def test_invalid_event_is_dropped(make_writer):
+    """The rest of the batch is written"""
+    writer = make_writer({1: psycopg.DataError("value too long")})
+    assert writer._flush(_events(4))  # pylint: disable=protected-access
+    assert writer.written == [0, 2, 3]
+
+
+def test_database_gone_during_retry_spills_remaining_events(make_writer):
+    """Events after the database went away are kept, not dropped"""
+    writer = make_writer(
+        {
+            1: psycopg.IntegrityError("duplicate key"),
+            2: psycopg.OperationalError("server closed the connection"),
+        }
+    )
+    assert not writer._flush(_events(5))  # pylint: disable=protected-access
+    assert writer.written == [0]
+    assert _spilled(writer) == [2, 3, 4]
+
+
+def test_permanent_error_is_dropped_not_spilled(make_writer):
+    """An event for an unknown table would be spilled and replayed forever"""
+    writer = make_writer({1: psycopg.errors.UndefinedTable("no such table")})
+    assert writer._flush(_events(3))  # pylint: disable=protected-access
+    assert writer.written == [0, 2]
+    assert not os.path.exists(writer.spill_path)
@@ -0,0 +1,83 @@
+"""An interrupted export continues where it stopped"""
+
+import csv
+import io
+import zipfile
+
+import pytest
+
+from tweevoortwaalf import export
+
+
+class Interrupted(Exception):
+    """Stands in for the export being killed"""
+
+
+def _interrupt_after_batches(monkeypatch, n_batches: int) -> None:
+    write = export.ExportWriter.write
+    calls = []
+
+    def interrupting_write(self, results, extension):
+        if len(calls) == n_batches:
+            raise Interrupted
+        calls.append(len(results))
+        write(self, results, extension)
+
+    monkeypatch.setattr(export.ExportWriter, "write", interrupting_write)
+
+
+def _export(output: str) -> int:
+    return export.export(
+        "taartpuzzel", 10, output, seed=1, processes=1, batch_size=4, size=100
+    )
+
+
+def test_interrupted_archive_export_resumes(tmp_path, monkeypatch):
+    """The archive is only written, completely, when the export is finished"""
+    output = str(tmp_path / "taart.zip")
+    _interrupt_after_batches(monkeypatch, 1)
+    with pytest.raises(Interrupted):
+        _export(output)
+    assert not (tmp_path / "taart.zip").exists()
+    # Left behind when zipping the archive itself was interrupted
+    (tmp_path / "taart.zip.partial").write_bytes(b"PK\x03\x04 truncated")
+
+    monkeypatch.undo()
+    assert _export(output) == 6
+
+    with zipfile.ZipFile(output) as archive:
+        assert archive.testzip() is None
+        manifest = list(
+            csv.DictReader(io.StringIO(archive.read("manifest.csv").decode("utf-8")))
+        )
+        assert sorted(int(row["index"]) for row in manifest) == list(range(10))
+        assert sorted(archive.namelist()) == sorted(
+            [row["file"] for row in manifest] + ["manifest.csv"]
+        )
+    assert not (tmp_path / "taart.zip.parts").exists()
+    assert not (tmp_path / "taart.zip.partial").exists()
+    # Everything is exported already
+    assert _export(output) == 0
+
+
+def test_interrupted_directory_export_resumes(tmp_path, monkeypatch):
+    """Only the missing images are written when the export is run again"""
+    output = str(tmp_path / "taart")
+    _interrupt_after_batches(monkeypatch, 2)
+    with pytest.raises(Interrupted):
+        _export(output)
+
+    monkeypatch.undo()
+    assert _export(output) == 2
+    with open(tmp_path / "taart" / "manifest.csv", newline="", encoding="utf-8") as f:
+        files = [row["file"] for row in csv.DictReader(f)]
+    assert len(files) == len(set(files)) == 10
+    assert all((tmp_path / "taart" / file).exists() for file in files)
+
+
+def test_other_settings_are_refused(tmp_path):
+    """Continuing with other settings would mix two exports"""
+    output = str(tmp_path / "taart.zip")
+    _export(output)
+    with pytest.raises(ValueError):
+        export.export("taartpuzzel", 10, output, seed=2, processes=1)
@@ -0,0 +1,27 @@
+"""Woordrader puzzles always have a unique solution, or are not created"""
+
+import pytest
+
+from tweevoortwaalf.woordpuzzel import NonUniqueQuizException
+from tweevoortwaalf.woordrader import WoordRader, is_unique_starting_position
+
+
+def test_starting_position_is_unique():
+    """Another word never fits all correctly shown letters"""
+    for _ in range(50):
+        puzzle = WoordRader(p_wrong=0.2, p_unknown=0.2)
+        assert is_unique_starting_position(puzzle.state, puzzle.anagram_index)
+
+
+def test_no_unique_starting_position_for_answer():
+    """Without correctly shown letters, every word fits"""
+    answer = str(WoordRader(p_wrong=0, p_unknown=0).answer)
+    with pytest.raises(NonUniqueQuizException):
+        WoordRader(answer, p_wrong=0, p_unknown=1)
+
+
+def test_no_unique_starting_position_for_any_answer(caplog):
+    """Other answers are tried before giving up"""
+    with pytest.raises(NonUniqueQuizException):
+        WoordRader(p_wrong=0, p_unknown=1)
+    assert "selecting new answer" in caplog.text
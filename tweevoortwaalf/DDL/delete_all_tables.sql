@@ -2,6 +2,7 @@ DROP TABLE woordrader.games CASCADE;
 DROP TABLE woordrader.shownletters;
 DROP TABLE woordrader.boughtletters;
 DROP TABLE woordrader.guesses;
+DROP TABLE woordrader.difficulty;
 
 DROP TABLE paardensprong.games CASCADE;
 DROP TABLE paardensprong.guesses;
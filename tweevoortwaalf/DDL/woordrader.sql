@@ -32,3 +32,18 @@ CREATE TABLE IF NOT EXISTS woordrader.boughtletters (
     letterposition INT NOT NULL,
     buytime TIMESTAMP NOT NULL
 );
+
+-- Written offline by `python -m tweevoortwaalf.difficulty`; the app does not read it.
+-- Unlike the `puzzleoptions` tables of the other games it has no direction or
+-- startpoint, and probability is the share of simulated games identifiable with 0
+-- letters bought
+CREATE TABLE IF NOT EXISTS woordrader.difficulty (
+    difficulty_id SERIAL PRIMARY KEY,
+    answer CHAR(12) NOT NULL,
+    p_wrong NUMERIC(3, 2) NOT NULL,
+    p_unknown NUMERIC(3, 2) NOT NULL,
+    n_games INT NOT NULL,
+    mean_letters_bought NUMERIC(5, 3) NOT NULL,
+    p90_letters_bought NUMERIC(4, 1) NOT NULL,
+    probability NUMERIC(5, 4) NOT NULL
+);
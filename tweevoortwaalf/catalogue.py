@@ -0,0 +1,138 @@
+"""Catalogue of all puzzle configurations with a unique solution
+
+The catalogue is stored column-wise in a compressed numpy archive shipped with the
+package, with the answers stored once and referenced by index. Sampling a puzzle from
+it takes constant time. It is also the canonical source for the `puzzleoptions` tables
+used by the hard mode.
+"""
+
+import importlib.resources
+import itertools
+import random
+from typing import Dict, Union
+
+import numpy as np
+import pandas as pd
+
+from .paardensprong import Paardensprong
+from .taartpuzzel import Taartpuzzel
+from .wordstore import get_wordstore
+
+CATALOGUE_GAMES = (Paardensprong, Taartpuzzel)
+
+
+def catalogue_filename(puzzleclass: type) -> str:
+    """Name of the file in the package data containing the catalogue"""
+    return f"{puzzleclass.__name__.lower()}_catalogue.npz"
+
+
+class PuzzleCatalogue:
+    """All configurations of a puzzle with a unique solution
+
+    Parameters
+    ----------
+    words : np.ndarray
+        The distinct answers
+    columns : Dict[str, np.ndarray]
+        Equally long columns: `answer_id`, the index of the answer in `words`, and the
+        other keyword arguments of the puzzle, e.g. `direction` and `startpoint`
+    """
+
+    def __init__(self, words: np.ndarray, columns: Dict[str, np.ndarray]):
+        self.words = words
+        self.columns = columns
+        self._n_rows = len(columns["answer_id"])
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "PuzzleCatalogue":
+        """Create catalogue from a DataFrame with an `answer` column and integer columns"""
+        answer_id, words = pd.factorize(df["answer"])
+        columns = {"answer_id": answer_id.astype(np.min_scalar_type(len(words)))}
+        for col in df.columns.drop("answer"):
+            columns[col] = df[col].to_numpy(dtype=np.int8)
+        return cls(np.asarray(words, dtype=str), columns)
+
+    @classmethod
+    def load(cls, path) -> "PuzzleCatalogue":
+        """Read the catalogue from a numpy archive"""
+        with np.load(path) as archive:
+            columns = {name: archive[name] for name in archive.files}
+        words = columns.pop("words")
+        return cls(words, columns)
+
+    def save(self, path) -> None:
+        """Write the catalogue to a compressed numpy archive"""
+        np.savez_compressed(path, words=self.words, **self.columns)
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+    def sample(self) -> Dict[str, Union[str, int]]:
+        """Select a random configuration as keyword arguments for the puzzle"""
+        return self.configuration(random.randrange(self._n_rows))
+
+    def configuration(self, row: int) -> Dict[str, Union[str, int]]:
+        """The configuration in this row as keyword arguments for the puzzle"""
+        kwargs = {}
+        for name, column in self.columns.items():
+            if name == "answer_id":
+                kwargs["answer"] = str(self.words[column[row]])
+            else:
+                kwargs[name] = int(column[row])
+        return kwargs
+
+    def to_frame(self) -> pd.DataFrame:
+        """All configurations as DataFrame, e.g. to bulk load into `puzzleoptions`"""
+        df = pd.DataFrame(
+            {name: col for name, col in self.columns.items() if name != "answer_id"}
+        )
+        df.insert(0, "answer", self.words[self.columns["answer_id"]])
+        return df
+
+
+def generate_catalogue(puzzleclass: type) -> PuzzleCatalogue:
+    """Enumerate all configurations of a puzzle with a unique solution
+
+    Parameters
+    ----------
+    puzzleclass : type
+        Paardensprong or Taartpuzzel
+    """
+    options = puzzleclass.unique_options()
+    layouts = pd.DataFrame(
+        itertools.product([-1, 1], range(puzzleclass.n_letters)),
+        columns=["direction", "startpoint"],
+    )
+    configurations = options.merge(layouts, how="cross")
+    return PuzzleCatalogue.from_frame(configurations)
+
+
+def _load_catalogue(puzzleclass: type) -> PuzzleCatalogue:
+    data_path = importlib.resources.files("tweevoortwaalf.Data").joinpath(
+        catalogue_filename(puzzleclass)
+    )
+    with importlib.resources.as_file(data_path) as path:
+        return PuzzleCatalogue.load(path)
+
+
+def get_catalogue(puzzleclass: type) -> PuzzleCatalogue:
+    """Get the shared catalogue of a puzzle, loaded from the package data on first use"""
+    if puzzleclass not in CATALOGUE_GAMES:
+        raise ValueError(f"No catalogue available for {puzzleclass.__name__}")
+    return get_wordstore(puzzleclass.n_letters).derived(
+        f"catalogue_{puzzleclass.__name__}", lambda _: _load_catalogue(puzzleclass)
+    )
+
+
+def main():
+    """Write the catalogues for all games to the package data"""
+    data_dir = importlib.resources.files("tweevoortwaalf.Data")
+    for puzzleclass in CATALOGUE_GAMES:
+        catalogue = generate_catalogue(puzzleclass)
+        catalogue.save(data_dir.joinpath(catalogue_filename(puzzleclass)))
+        print(f"{puzzleclass.__name__}: {len(catalogue)} configurations")
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,261 @@
+"""Estimate the difficulty of woordrader answers by simulating games
+
+For every answer and setting of `p_wrong` and `p_unknown`, many starting positions are
+generated as the game would, and for each the simulator finds the fewest letters a
+player needs to buy before the answer is the only most likely word.
+
+The player does not know which shown letters are wrong. A word explains the shown
+letters with a number of misfits: shown letters that do not occur among its letters.
+As wrong letters are rare, the words with the fewest misfits are the most likely, and
+the answer is identifiable once no other word has as few misfits as the answer itself.
+Buying a letter shows where it belongs in the answer, or a "?" if it was shown wrong,
+which rules out the words without that letter there or removes a misfit. The buying
+policy is optimal: the fewest letters after which the answer is identifiable, found by
+trying all sets of letters of increasing size. Unknown letters ("-") are never bought,
+since they reveal nothing.
+
+Candidate words are pruned with bitsets per position and letter, and the answers are
+simulated in a process pool. The result is the offline table `woordrader.difficulty`
+(see DDL/woordrader.sql). Its `probability` means "identifiable with 0 letters bought":
+the share of games in which the answer is the only most likely word before buying
+letters. It is not a hard mode `puzzleoptions` table: the woordrader has no hard mode,
+and the app does not read it.
+
+Run as `python -m tweevoortwaalf.difficulty --output woordrader_difficulty.csv`
+"""
+
+import argparse
+import itertools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .woordrader import (
+    WRONG_LETTERS,
+    WoordRaderState,
+    generate_unique_starting_positions,
+)
+from .wordindex import PositionLetterIndex, get_anagram_index, get_position_letter_index
+from .wordstore import get_wordstore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = ((0.05, 0.05),)
+# As in woordrader.difficulty
+TABLE_COLUMNS = [
+    "answer",
+    "p_wrong",
+    "p_unknown",
+    "n_games",
+    "mean_letters_bought",
+    "p90_letters_bought",
+    "probability",
+]
+
+
+class DifficultySimulator:
+    """Finds how many letters must be bought to identify the answer of a game
+
+    Parameters
+    ----------
+    position_index : PositionLetterIndex
+        All words a player could guess
+    """
+
+    def __init__(self, position_index: PositionLetterIndex):
+        self.position_index = position_index
+        letters = set(itertools.chain.from_iterable(position_index.words))
+        self.alphabet = sorted(letters.union(WRONG_LETTERS))
+        self._letter_ids = {letter: i for i, letter in enumerate(self.alphabet)}
+        self.letter_counts = np.zeros(
+            (len(position_index.words), len(self.alphabet)), dtype=np.int16
+        )
+        for word_id, word in enumerate(position_index.words):
+            for letter in word:
+                self.letter_counts[word_id, self._letter_ids[letter]] += 1
+
+    def _count(self, letters: Iterable[str]) -> np.ndarray:
+        counts = np.zeros(len(self.alphabet), dtype=np.int16)
+        for letter in letters:
+            counts[self._letter_ids[letter]] += 1
+        return counts
+
+    def letters_to_buy(self, state: WoordRaderState) -> int:
+        """The fewest letters to buy before the answer is the only most likely word
+
+        Returns the number of letters in the game if buying never singles it out
+        """
+        buyable = [q for q in range(len(state)) if state.shown[q] != "-"]
+        if all(state.is_correct(q) for q in buyable):
+            # Starting positions are generated such that no other word contains all
+            # correctly shown letters
+            return 0
+
+        answer_id = self.position_index.word_id(state.answer)
+        tiles = np.array(
+            [self._count([] if letter == "-" else [letter]) for letter in state.shown]
+        )
+        shown = tiles[buyable].sum(axis=0)
+        for n_bought in range(len(buyable) + 1):
+            for bought in itertools.combinations(buyable, n_bought):
+                if self._identified(state, answer_id, tiles, shown, bought):
+                    return n_bought
+        return len(state)
+
+    # pylint: disable-next=too-many-arguments
+    def _identified(
+        self,
+        state: WoordRaderState,
+        answer_id: int,
+        tiles: np.ndarray,
+        shown: np.ndarray,
+        bought: Tuple[int, ...],
+    ) -> bool:
+        known = {
+            state.answer_position[q]: state.shown[q]
+            for q in bought
+            if state.is_correct(q)
+        }
+        candidates = self.position_index.word_ids(self.position_index.matching(known))
+        if len(candidates) == 1:
+            return True
+        # Bought letters are placed (or shown to be wrong), so are no longer misfits
+        unplaced = shown - tiles[list(bought)].sum(axis=0)
+        free = self.letter_counts[candidates] - self._count(known.values())
+        misfits = np.maximum(unplaced - free, 0).sum(axis=1)
+        answer_misfits = misfits[np.searchsorted(candidates, answer_id)]
+        return np.count_nonzero(misfits <= answer_misfits) == 1
+
+    def simulate(
+        self,
+        answer: str,
+        p_wrong: float,
+        p_unknown: float,
+        n_games: int,
+        rng: Optional[np.random.Generator] = None,
+    ) -> np.ndarray:
+        """The letters to buy in `n_games` games with this answer
+
+        Games for which no unique starting position is found are left out
+        """
+        states = generate_unique_starting_positions(
+            [answer] * n_games, p_wrong, p_unknown, rng
+        )
+        return np.array([self.letters_to_buy(state) for state in states])
+
+
+def get_difficulty_simulator(n_letters: int = 12) -> DifficultySimulator:
+    """Get the shared simulator for answers of length `n_letters`"""
+    return get_wordstore(n_letters).derived(
+        "difficulty_simulator",
+        lambda wordstore: DifficultySimulator(
+            get_position_letter_index(wordstore.n_letters)
+        ),
+    )
+
+
+def _simulate_answer(
+    task: Tuple[str, float, float, int, Sequence[int]]
+) -> Optional[dict]:
+    answer, p_wrong, p_unknown, n_games, seed = task
+    letters_bought = get_difficulty_simulator(len(answer)).simulate(
+        answer, p_wrong, p_unknown, n_games, np.random.default_rng(seed)
+    )
+    if len(letters_bought) == 0:
+        logger.warning(
+            "No unique starting position for %r with p_wrong=%s and p_unknown=%s, "
+            "leaving it out",
+            answer,
+            p_wrong,
+            p_unknown,
+        )
+        return None
+    return {
+        "answer": answer,
+        "p_wrong": p_wrong,
+        "p_unknown": p_unknown,
+        # Games without a unique starting position are left out
+        "n_games": len(letters_bought),
+        "mean_letters_bought": letters_bought.mean(),
+        "p90_letters_bought": np.quantile(letters_bought, 0.9),
+        # Identifiable with 0 letters bought
+        "probability": np.mean(letters_bought == 0),
+    }
+
+
+# pylint: disable-next=too-many-arguments
+def difficulty_table(
+    answers: Sequence[str],
+    settings: Iterable[Tuple[float, float]] = DEFAULT_SETTINGS,
+    n_games: int = 1000,
+    seed: int = 0,
+    processes: Optional[int] = None,
+) -> pd.DataFrame:
+    """Simulate games for every answer and setting in a process pool
+
+    Parameters
+    ----------
+    answers : Sequence[str]
+        The answers, all of the same length
+    settings : Iterable[Tuple[float, float]]
+        The combinations of `p_wrong` and `p_unknown` to simulate
+    n_games : int
+        The number of games per answer and setting. Games without a unique starting
+        position are left out, and so are answers and settings without any
+    seed : int
+        Seed for the starting positions; the table does not depend on `processes`
+    processes : Optional[int]
+        The number of worker processes, by default the number of CPUs
+    """
+    tasks = [
+        (answer, p_wrong, p_unknown, n_games, (seed, i, j))
+        for j, (p_wrong, p_unknown) in enumerate(settings)
+        for i, answer in enumerate(answers)
+    ]
+    processes = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(processes) as executor:
+        chunksize = max(1, len(tasks) // (4 * processes))
+        rows: List[dict] = [
+            row
+            for row in executor.map(_simulate_answer, tasks, chunksize=chunksize)
+            if row is not None
+        ]
+    return pd.DataFrame(rows, columns=TABLE_COLUMNS)
+
+
+def main(argv=None):
+    """Write the difficulty table of the woordrader answers"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", required=True, help="CSV file to write")
+    parser.add_argument(
+        "--setting",
+        nargs=2,
+        type=float,
+        action="append",
+        metavar=("P_WRONG", "P_UNKNOWN"),
+        help="A setting to simulate, may be repeated (default 0.05 0.05)",
+    )
+    parser.add_argument("--games", type=int, default=1000, help="Games per answer")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, help="Default: number of CPUs")
+    parser.add_argument("--limit", type=int, help="Only simulate the first answers")
+    args = parser.parse_args(argv)
+
+    answers = get_anagram_index(12).unique_words.tolist()[: args.limit]
+    table = difficulty_table(
+        answers,
+        [tuple(setting) for setting in args.setting or DEFAULT_SETTINGS],
+        args.games,
+        args.seed,
+        args.processes,
+    )
+    table.to_csv(args.output, index=False)
+    print(f"{len(table)} rows written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
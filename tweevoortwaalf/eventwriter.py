@@ -0,0 +1,223 @@
+"""Write-behind queue that writes events to the database in batches
+
+Events (e.g. guesses and bought letters) are put on an in-process queue and written by
+a background thread with one multi-row insert per table, so the request that created
+them does not wait for the database. When the database is unreachable, batches are
+kept in a bounded local spill file and written once the database is back.
+"""
+
+import datetime
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import psycopg
+from psycopg_pool import ConnectionPool, PoolTimeout
+
+logger = logging.getLogger(__name__)
+
+Event = Tuple[str, Dict]
+SPILL_PREFIX = "tweevoortwaalf-events-"
+
+
+def _encode(value):
+    if isinstance(value, datetime.datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Can not spill value of type {type(value)}")
+
+
+def _decode(dct: dict):
+    if "__datetime__" in dct:
+        return datetime.datetime.fromisoformat(dct["__datetime__"])
+    return dct
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# pylint: disable=too-many-instance-attributes
+class EventWriter:
+    """Write events to the database in batches from a background thread
+
+    Parameters
+    ----------
+    pool : ConnectionPool
+        The pool to get database connections from
+    spill_dir : str
+        Directory for the spill file of this process. Spill files left behind by
+        processes that are no longer running are written as well
+    batch_size : int
+        Maximum number of events written at once
+    flush_interval : float
+        Maximum number of seconds an event waits before it is written
+    max_queue_size : int
+        Events are dropped (and logged) when the queue is full
+    max_spill_bytes : int
+        Events are dropped (and logged) when the spill file is full
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        pool: ConnectionPool,
+        spill_dir: str,
+        *,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_queue_size: int = 10_000,
+        max_spill_bytes: int = 10_000_000,
+    ):
+        self.pool = pool
+        self.spill_dir = spill_dir
+        self.spill_path = os.path.join(spill_dir, f"{SPILL_PREFIX}{os.getpid()}.jsonl")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_spill_bytes = max_spill_bytes
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="EventWriter", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, table_name: str, data: dict) -> None:
+        """Queue a row for the table `table_name`; returns immediately
+
+        Parameters
+        ----------
+        table_name : str
+            The name of the table (incl. schema) to which the data should be written
+        data : dict
+            Dictionary with column name as key and values as values of the dictionary
+        """
+        try:
+            self._queue.put_nowait((table_name, data))
+        except queue.Full:
+            logger.error(
+                "Event queue full, dropping event for %s: %s", table_name, data
+            )
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Write all queued events and stop the background thread"""
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        self._adopt_orphaned_spill_files()
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._collect_batch()
+            if batch and self._flush(batch) and os.path.exists(self.spill_path):
+                self._replay_spill_file(self.spill_path)
+
+    def _collect_batch(self) -> List[Event]:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self._stop.is_set() and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.1)))
+            except queue.Empty:
+                pass
+        return batch
+
+    def _flush(self, batch: List[Event]) -> bool:
+        """Write the batch, or spill it if the database is unavailable
+
+        Returns whether the database was available
+        """
+        try:
+            self._insert(batch)
+        except (psycopg.OperationalError, PoolTimeout):
+            logger.warning("Database unavailable, spilling %s events", len(batch))
+            self._spill(batch)
+            return False
+        except psycopg.DatabaseError:
+            # An invalid row should not prevent the rest of the batch being written
+            for i, event in enumerate(batch):
+                try:
+                    self._insert([event])
+                except (psycopg.OperationalError, PoolTimeout):
+                    logger.warning(
+                        "Database unavailable, spilling %s events", len(batch) - i
+                    )
+                    self._spill(batch[i:])
+                    return False
+                except psycopg.DatabaseError:
+                    # E.g. an invalid value or an unknown column, which would fail
+                    # the same way when written again later
+                    logger.exception(
+                        "Dropping event that can not be written: %s", event
+                    )
+        return True
+
+    def _insert(self, batch: List[Event]) -> None:
+        grouped: Dict[Tuple[str, Tuple[str, ...]], List[tuple]] = {}
+        for table_name, data in batch:
+            key = (table_name, tuple(data.keys()))
+            grouped.setdefault(key, []).append(tuple(data.values()))
+
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                for (table_name, columns), rows in grouped.items():
+                    row_placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+                    query = (
+                        f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES "
+                        + ", ".join([row_placeholder] * len(rows))
+                        + ";"
+                    )
+                    cur.execute(query, [value for row in rows for value in row])
+            conn.commit()
+
+    def _spill(self, batch: List[Event]) -> None:
+        if not batch:
+            return
+        lines = "".join(json.dumps(event, default=_encode) + "\n" for event in batch)
+        size = (
+            os.path.getsize(self.spill_path) if os.path.exists(self.spill_path) else 0
+        )
+        if size + len(lines.encode("utf-8")) > self.max_spill_bytes:
+            logger.error("Spill file full, dropping %s events: %s", len(batch), batch)
+            return
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    def _replay_spill_file(self, path: str) -> None:
+        with open(path, encoding="utf-8") as f:
+            events = [tuple(json.loads(line, object_hook=_decode)) for line in f]
+        os.remove(path)
+        for start in range(0, len(events), self.batch_size):
+            if not self._flush(events[start : start + self.batch_size]):
+                self._spill(events[start + self.batch_size :])
+                return
+
+    def _adopt_orphaned_spill_files(self) -> None:
+        for path in glob.glob(os.path.join(self.spill_dir, f"{SPILL_PREFIX}*.jsonl")):
+            if path == self.spill_path:
+                continue
+            try:
+                pid = int(os.path.basename(path)[len(SPILL_PREFIX) : -len(".jsonl")])
+            except ValueError:
+                continue
+            if _process_alive(pid):
+                continue
+            claimed = f"{self.spill_path}.{pid}"
+            try:
+                # Rename first, so no two processes write the same events
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            logger.info("Writing events spilled by process %s", pid)
+            self._replay_spill_file(claimed)
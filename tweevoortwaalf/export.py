@@ -0,0 +1,225 @@
+"""Export many puzzle images with their answers, e.g. for printable puzzle books
+
+Configurations are drawn from the catalogue in a random order without repeats, rendered
+in a process pool in batches, and written to a directory or a single zip archive. A
+manifest (CSV) lists the file, answer and configuration of every puzzle, and is written
+as the export goes, so an interrupted export continues where it stopped when it is run
+again with the same arguments. An archive is only zipped once all images are written, so
+an interruption never leaves a broken archive behind. Memory use depends on the batch
+size, not on the number of puzzles.
+
+Run as e.g. `python -m tweevoortwaalf.export taartpuzzel --count 1000 --output taart`, or
+with `--output taart.zip` to write a single archive.
+"""
+
+import argparse
+import csv
+import json
+import os
+import shutil
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from .catalogue import get_catalogue
+from .paardensprong import Paardensprong
+from .puzzleimages import IMAGE_FORMATS, render_puzzle_image
+from .taartpuzzel import Taartpuzzel
+
+EXPORT_GAMES = {"taartpuzzel": Taartpuzzel, "paardensprong": Paardensprong}
+
+Configuration = Dict[str, Union[str, int]]
+
+
+def configurations(
+    puzzlename: str, count: int, seed: int = 0
+) -> Iterator[Tuple[int, Configuration]]:
+    """The first `count` configurations of the catalogue in a random order
+
+    The order only depends on the seed, so an export can be continued
+    """
+    catalogue = get_catalogue(EXPORT_GAMES[puzzlename])
+    if count > len(catalogue):
+        raise ValueError(
+            f"Only {len(catalogue)} {puzzlename} configurations, not {count}"
+        )
+    rows = np.random.default_rng(seed).permutation(len(catalogue))[:count]
+    for index, row in enumerate(rows.tolist()):
+        yield index, catalogue.configuration(row)
+
+
+def _render(
+    task: Tuple[str, int, Configuration, str, Optional[int]]
+) -> Tuple[int, Configuration, bytes]:
+    puzzlename, index, configuration, image_format, size = task
+    puzzle = EXPORT_GAMES[puzzlename](**configuration)
+    image = render_puzzle_image(puzzlename, puzzle.create_puzzle(), image_format, size)
+    return index, configuration, image
+
+
+class ExportWriter:
+    """Writes images and the manifest rows, and knows which are written already
+
+    Parameters
+    ----------
+    output : str
+        A directory, or a file ending in .zip for a single archive
+    settings : dict
+        The arguments of the export; continuing with other settings raises ValueError
+    """
+
+    def __init__(self, output: str, settings: dict):
+        self.output = output
+        self.is_archive = output.endswith(".zip")
+        if self.is_archive:
+            # Images are collected in a directory and only zipped when all are
+            # written, so an interruption never leaves a broken archive behind
+            self.directory = output + ".parts"
+            self.manifest_path = output + ".manifest.csv"
+            settings_path = output + ".settings.json"
+            os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        else:
+            self.directory = output
+            self.manifest_path = os.path.join(output, "manifest.csv")
+            settings_path = os.path.join(output, "settings.json")
+            os.makedirs(output, exist_ok=True)
+        self._check_settings(settings_path, settings)
+        self.done = self._read_done()
+
+    @staticmethod
+    def _check_settings(path: str, settings: dict) -> None:
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                previous = json.load(f)
+            if previous != settings:
+                raise ValueError(
+                    f"{path} was exported with {previous}, not {settings}; "
+                    "use another output to start a new export"
+                )
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(settings, f)
+
+    def _read_done(self) -> Set[int]:
+        if not os.path.exists(self.manifest_path):
+            return set()
+        with open(self.manifest_path, newline="", encoding="utf-8") as f:
+            return {int(row["index"]) for row in csv.DictReader(f)}
+
+    def write(self, results: List[Tuple[int, Configuration, bytes]], extension: str):
+        """Write a batch of images, then add them to the manifest"""
+        os.makedirs(self.directory, exist_ok=True)
+        rows = []
+        for index, configuration, image in results:
+            filename = f"{index:07d}.{extension}"
+            path = os.path.join(self.directory, filename)
+            with open(path + ".tmp", "wb") as f:
+                f.write(image)
+            os.replace(path + ".tmp", path)
+            rows.append({"index": index, "file": filename, **configuration})
+
+        write_header = not os.path.exists(self.manifest_path)
+        with open(self.manifest_path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            if write_header:
+                writer.writeheader()
+            writer.writerows(rows)
+        self.done.update(index for index, _, _ in results)
+
+    def finish(self) -> None:
+        """Zip the images and the manifest into the archive"""
+        if not self.is_archive or not os.path.isdir(self.directory):
+            return
+        with open(self.manifest_path, newline="", encoding="utf-8") as f:
+            filenames = [row["file"] for row in csv.DictReader(f)]
+        partial = self.output + ".partial"
+        with zipfile.ZipFile(partial, "w") as archive:
+            for filename in filenames:
+                archive.write(os.path.join(self.directory, filename), filename)
+            archive.write(self.manifest_path, "manifest.csv")
+        os.replace(partial, self.output)
+        shutil.rmtree(self.directory)
+
+
+# pylint: disable-next=too-many-arguments
+def export(
+    puzzlename: str,
+    count: int,
+    output: str,
+    *,
+    image_format: str = "png",
+    size: Optional[int] = None,
+    seed: int = 0,
+    processes: Optional[int] = None,
+    batch_size: int = 256,
+) -> int:
+    """Render `count` puzzles to `output`, skipping those exported before
+
+    Returns the number of images written
+    """
+    if puzzlename not in EXPORT_GAMES:
+        raise ValueError(f"Can not export {puzzlename}")
+    writer = ExportWriter(
+        output,
+        {
+            "puzzlename": puzzlename,
+            "count": count,
+            "format": image_format,
+            "size": size,
+            "seed": seed,
+        },
+    )
+    todo = (
+        (puzzlename, index, configuration, image_format, size)
+        for index, configuration in configurations(puzzlename, count, seed)
+        if index not in writer.done
+    )
+    processes = processes or os.cpu_count() or 1
+    written = 0
+    with ProcessPoolExecutor(processes) as executor:
+        while True:
+            batch = [task for _, task in zip(range(batch_size), todo)]
+            if not batch:
+                break
+            chunksize = max(1, len(batch) // (4 * processes))
+            results = list(executor.map(_render, batch, chunksize=chunksize))
+            writer.write(results, image_format)
+            written += len(results)
+            print(f"{len(writer.done)}/{count} puzzles exported", flush=True)
+    writer.finish()
+    return written
+
+
+def main(argv=None):
+    """Export puzzle images and their answers from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("puzzlename", choices=sorted(EXPORT_GAMES))
+    parser.add_argument("--count", type=int, required=True, help="Number of puzzles")
+    parser.add_argument(
+        "--output", required=True, help="Directory, or a .zip file for an archive"
+    )
+    parser.add_argument("--format", default="png", choices=sorted(IMAGE_FORMATS))
+    parser.add_argument("--size", type=int, help="Width and height in pixels")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, help="Default: number of CPUs")
+    parser.add_argument(
+        "--batch-size", type=int, default=256, help="Images rendered per batch"
+    )
+    args = parser.parse_args(argv)
+    written = export(
+        args.puzzlename,
+        args.count,
+        args.output,
+        image_format=args.format,
+        size=args.size,
+        seed=args.seed,
+        processes=args.processes,
+        batch_size=args.batch_size,
+    )
+    print(f"{written} images written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Board fragments that are rendered once, after which only the letters are filled in
+
+The boards of the games have a fixed structure and only the letters differ between
+puzzles. A `BoardFragment` renders its template once with markers in place of the
+letters, and splits the result into the static parts in between. Filling in a puzzle
+is then a single string join.
+"""
+
+import html
+import re
+import threading
+from typing import Any, Callable, Collection, Dict, List, Sequence, Tuple
+
+_MARKER = "\x00{}\x00"
+_MARKER_PATTERN = re.compile("\x00([0-9]+)\x00")
+
+
+# pylint: disable=too-few-public-methods
+class BoardFragment:
+    """Renders a board template per structure, and fills in letters with a string join
+
+    Parameters
+    ----------
+    render : Callable[[Any], str]
+        Renders the template for a state
+    to_letters : Callable[[Any], Sequence[str]]
+        Gets the letters of all cells from a state
+    from_letters : Callable[[Sequence[str]], Any]
+        Builds a state from the letters of all cells
+    structural : Collection[str]
+        Letters that change the markup around them (such as a CSS class). These are
+        part of the skeleton, so there is a skeleton for every place they occur in
+    """
+
+    def __init__(
+        self,
+        render: Callable[[Any], str],
+        to_letters: Callable[[Any], Sequence[str]],
+        from_letters: Callable[[Sequence[str]], Any],
+        structural: Collection[str] = (),
+    ):
+        self.render = render
+        self.to_letters = to_letters
+        self.from_letters = from_letters
+        self.structural = frozenset(structural)
+        self._skeletons: Dict[Tuple[str, ...], Tuple[List[str], List[int]]] = {}
+        self._lock = threading.Lock()
+
+    def _compile(self, letters: Sequence[str]) -> Tuple[List[str], List[int]]:
+        """Render with markers and split into the static parts and the cell per gap"""
+        marked = [
+            letter if letter in self.structural else _MARKER.format(i)
+            for i, letter in enumerate(letters)
+        ]
+        pieces = _MARKER_PATTERN.split(self.render(self.from_letters(marked)))
+        return pieces[::2], [int(cell) for cell in pieces[1::2]]
+
+    def __call__(self, state: Any) -> str:
+        """Render the board for `state`"""
+        letters = self.to_letters(state)
+        key = tuple(letter if letter in self.structural else "" for letter in letters)
+        try:
+            parts, cells = self._skeletons[key]
+        except KeyError:
+            with self._lock:
+                if key not in self._skeletons:
+                    self._skeletons[key] = self._compile(letters)
+                parts, cells = self._skeletons[key]
+
+        filled = [parts[0]]
+        for cell, part in zip(cells, parts[1:]):
+            filled.append(html.escape(letters[cell]))
+            filled.append(part)
+        return "".join(filled)
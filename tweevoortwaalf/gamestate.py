@@ -0,0 +1,143 @@
+"""Server-side stores for the state of games in progress
+
+The browser only gets an opaque key, while the game itself (including the answer)
+stays on the server. `MemoryGameStateStore` is fastest but only works with a single
+worker process; `SQLiteGameStateStore` shares the games between all workers on a node.
+"""
+
+import abc
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class GameStateStore(abc.ABC):
+    """Base class for stores of game state, expiring games after `ttl` seconds"""
+
+    def __init__(self, ttl: float = 3600.0):
+        self.ttl = ttl
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """Get the game stored under `key`, or None if it does not exist or expired"""
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any) -> None:
+        """Store the game under `key`; changes to a game must be stored again"""
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove the game stored under `key`, if any"""
+
+
+class MemoryGameStateStore(GameStateStore):
+    """In-process least recently used store
+
+    Parameters
+    ----------
+    max_size : int
+        The least recently used game is removed when more games are stored
+    ttl : float
+        Number of seconds after the last change after which a game expires
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl: float = 3600.0):
+        super().__init__(ttl)
+        self.max_size = max_size
+        self._games: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            try:
+                expires_at, value = self._games[key]
+            except KeyError:
+                return None
+            if expires_at < time.monotonic():
+                del self._games[key]
+                return None
+            self._games.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._games[key] = (time.monotonic() + self.ttl, value)
+            self._games.move_to_end(key)
+            while len(self._games) > self.max_size:
+                self._games.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._games.pop(key, None)
+
+
+class SQLiteGameStateStore(GameStateStore):
+    """Store in a local SQLite database, shared by all worker processes
+
+    Parameters
+    ----------
+    path : str
+        Path to the database file, which is created if it does not exist
+    ttl : float
+        Number of seconds after the last change after which a game expires
+    """
+
+    # Remove expired games at most this often (in seconds)
+    purge_interval = 60.0
+
+    def __init__(self, path: str, ttl: float = 3600.0):
+        super().__init__(ttl)
+        self.path = path
+        self._local = threading.local()
+        self._last_purge = 0.0
+        conn = self._connection()
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS game_state (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires_at REAL NOT NULL
+            )"""
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can not be shared between threads
+        if not hasattr(self._local, "conn"):
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return self._local.conn
+
+    def get(self, key: str) -> Optional[Any]:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT value FROM game_state WHERE key = ? AND expires_at >= ?",
+                (key, time.time()),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO game_state (key, value, expires_at) VALUES (?, ?, ?)",
+            (
+                key,
+                pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL),
+                now + self.ttl,
+            ),
+        )
+        if now - self._last_purge > self.purge_interval:
+            self._last_purge = now
+            conn.execute("DELETE FROM game_state WHERE expires_at < ?", (now,))
+
+    def delete(self, key: str) -> None:
+        self._connection().execute("DELETE FROM game_state WHERE key = ?", (key,))
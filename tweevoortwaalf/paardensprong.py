@@ -1,8 +1,12 @@
-""" Generate Paardensprong puzzle and show it"""
+"""Generate Paardensprong puzzle and show it"""
 
 from typing import List
 
+import numpy as np
+import pandas as pd
+
 from .woordpuzzel import SmallWoordpuzzelMixin, Woordpuzzel
+from .wordindex import RotationIndex, get_rotation_index, rotate
 
 
 class Paardensprong(Woordpuzzel, SmallWoordpuzzelMixin):
@@ -25,14 +29,26 @@ class Paardensprong(Woordpuzzel, SmallWoordpuzzelMixin):
         n : int
             The number of places to rotate; must be less than or equal to length of wrd
         """
-        return wrd[n:] + wrd[:n]
+        return rotate(wrd, n)
+
+    @property
+    def rotation_index(self) -> RotationIndex:
+        """The shared index of words that are rotations of each other"""
+        return get_rotation_index(self.n_letters)
+
+    @property
+    def candidate_words(self) -> np.ndarray:
+        """Only select answers that have a unique solution"""
+        return self.rotation_index.unique_words
+
+    @classmethod
+    def unique_options(cls) -> pd.DataFrame:
+        """All answers with a unique solution"""
+        return pd.DataFrame({"answer": get_rotation_index(cls.n_letters).unique_words})
 
     def unique_solution(self):
         """Rotations can not lead to an alternative solution"""
-        for i in range(1, len(self.answer)):
-            if self.rotate(self.answer, i) in self.wordlist:
-                return False
-        return True
+        return self.rotation_index.is_unique(self.answer)
 
     def create_puzzle(self) -> List[List[str]]:
         """Create as a 3 x 3 grid of strings, each letter in the correct place"""
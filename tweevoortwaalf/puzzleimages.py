@@ -1,21 +1,132 @@
-"""Module for all images to be shown in Python as puzzle"""
+"""Module for all images to be shown in Python as puzzle
 
+Images can also be rendered headless to PNG or WebP bytes, e.g. for the web app, with
+`render_puzzle_image`; `RenderedImageCache` keeps recently rendered boards so identical
+boards are rendered once. Only showing an image needs matplotlib.
+
+Generating an image is cheap: the parts that are the same for every puzzle are drawn
+once per board and size and copied, fonts are loaded once per size, and letters are
+pasted from a glyph atlas instead of being measured and drawn. The taartpuzzel is drawn
+from the same precomputed layout as the board on the web page.
+"""
+
+import abc
+import collections
+import functools
+import hashlib
+import json
+import math
+import threading
 from io import BytesIO
+from typing import Any, Dict, Optional, Tuple
 
-import matplotlib.pyplot as plt
-import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
+from .taartlayout import get_taartpuzzel_layout
+
+# Format as used in URLs: the Pillow format and the content type
+IMAGE_FORMATS = {
+    "png": ("PNG", "image/png"),
+    "webp": ("WEBP", "image/webp"),
+}
+# Lossless WebP is smaller than the lossy default for these flat boards
+_SAVE_OPTIONS: Dict[str, Dict[str, Any]] = {"webp": {"lossless": True}}
+
+# Encoding into a buffer per thread, that is reused for every image
+_BUFFERS = threading.local()
+
+# The static part of every board, per image class and size
+_BACKGROUNDS: Dict[Tuple[type, int, int], Image.Image] = {}
+_BACKGROUNDS_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def load_font(font_size: int = 40) -> ImageFont.ImageFont:
+    """Load the font of the images once per size, falling back to the default font"""
+    try:
+        return ImageFont.truetype("arial.ttf", font_size)
+    except IOError:
+        return ImageFont.load_default()
+
+
+class GlyphAtlas:
+    """Pre-rasterised letters of a font, to paste into an image instead of drawing
+
+    Pasting a glyph gives the same pixels as drawing the text at the same position:
+    glyphs are rasterised per fraction of a pixel of the position, and the letters of
+    the alphabet (including ĳ) at whole pixels when the atlas is created.
+
+    Parameters
+    ----------
+    font : ImageFont.ImageFont
+        The font to rasterise the glyphs with
+    """
+
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZĲ?"
+
+    def __init__(self, font: ImageFont.ImageFont):
+        self.font = font
+        self._measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+        self._glyphs: Dict[Tuple[str, float, float], Tuple[int, int, Image.Image]] = {}
+        self._sizes: Dict[str, Tuple[int, int]] = {}
+        for letter in self.alphabet:
+            self._glyph(letter, 0.0, 0.0)
+
+    def size(self, text: str) -> Tuple[int, int]:
+        """Width and height of the bounding box of the text"""
+        try:
+            return self._sizes[text]
+        except KeyError:
+            left, top, right, bottom = self._measure.textbbox((0, 0), text, self.font)
+            return self._sizes.setdefault(text, (right - left, bottom - top))
+
+    def _glyph(self, text: str, x_fraction: float, y_fraction: float):
+        key = (text, x_fraction, y_fraction)
+        try:
+            return self._glyphs[key]
+        except KeyError:
+            pass
+        left, top, right, bottom = self._measure.textbbox((0, 0), text, self.font)
+        # Whole pixels of margin, so the glyph is drawn inside the mask
+        x_margin, y_margin = max(0, -left) + 1, max(0, -top) + 1
+        mask = Image.new("L", (x_margin + right + 2, y_margin + bottom + 2))
+        ImageDraw.Draw(mask).text(
+            (x_margin + x_fraction, y_margin + y_fraction), text, 255, self.font
+        )
+        return self._glyphs.setdefault(key, (x_margin, y_margin, mask))
+
+    def paste(self, image: Image.Image, xy: Tuple[float, float], text: str, fill):
+        """Draw the text with its top left at `xy`, like `ImageDraw.text`"""
+        x_fraction, x = math.modf(xy[0])
+        y_fraction, y = math.modf(xy[1])
+        x_margin, y_margin, mask = self._glyph(text, x_fraction, y_fraction)
+        image.paste(fill, (int(x) - x_margin, int(y) - y_margin), mask)
 
-class PuzzleImage:
-    """Base class for puzzle images"""
+
+@functools.lru_cache(maxsize=None)
+def get_glyph_atlas(font_size: int = 40) -> GlyphAtlas:
+    """Get the shared glyph atlas of the font of this size"""
+    return GlyphAtlas(load_font(font_size))
+
+
+class PuzzleImage(abc.ABC):
+    """Base class for puzzle images
+
+    Parameters
+    ----------
+    size : Optional[int]
+        Width and height of the image, by default 500 pixels
+    """
 
     width = 500
     height = 500
 
-    def __init__(self):
-        self.image = Image.new("RGB", (self.width, self.height), "red")
-        self.draw = ImageDraw.Draw(self.image)
+    def __init__(self, size: Optional[int] = None):
+        if size is not None:
+            self.width = self.height = size
+        self.font_size = 40 * self.width // 500
+        self.image: Optional[Image.Image] = None
+        self.draw: Optional[ImageDraw.ImageDraw] = None
 
     def load_font(self, font_size=40):
         """
@@ -24,18 +135,62 @@ class PuzzleImage:
         :param font_size: Size of the font.
         :return: Loaded font.
         """
+        return load_font(font_size)
+
+    @abc.abstractmethod
+    def draw_background(self):
+        """Draw the parts that are the same for every puzzle. Must be implemented by subclasses"""
+
+    @abc.abstractmethod
+    def draw_puzzle(self):
+        """Draw the letters of the puzzle. Must be implemented by subclasses"""
+
+    def _background(self) -> Image.Image:
+        key = (type(self), self.width, self.height)
+        with _BACKGROUNDS_LOCK:
+            if key not in _BACKGROUNDS:
+                self.image = Image.new("RGB", (self.width, self.height), "red")
+                self.draw = ImageDraw.Draw(self.image)
+                self.draw_background()
+                _BACKGROUNDS[key] = self.image
+            return _BACKGROUNDS[key]
+
+    def generate_image(self):
+        """Generate the complete image."""
+        self.image = self._background().copy()
+        self.draw = ImageDraw.Draw(self.image)
+        self.draw_puzzle()
+
+    def to_bytes(self, image_format: str = "png") -> bytes:
+        """The generated image, encoded as `image_format` ("png" or "webp")"""
         try:
-            return ImageFont.truetype("arial.ttf", font_size)
-        except IOError:
-            return ImageFont.load_default()
+            pil_format, _ = IMAGE_FORMATS[image_format]
+        except KeyError as e:
+            raise ValueError(f"Unknown image format {image_format!r}") from e
+        buffer = getattr(_BUFFERS, "buffer", None)
+        if buffer is None:
+            buffer = _BUFFERS.buffer = BytesIO()
+        buffer.seek(0)
+        buffer.truncate()
+        self.image.save(
+            buffer, format=pil_format, **_SAVE_OPTIONS.get(image_format, {})
+        )
+        return buffer.getvalue()
 
     def show_image(self):
         """Display the generated image."""
-        buffer = BytesIO()
-        self.image.save(buffer, format="PNG")
-        buffer.seek(0)
+        try:
+            # pylint: disable-next=import-outside-toplevel
+            import matplotlib.pyplot as plt
+        except ImportError as e:
+            raise RuntimeError(
+                "Can not import matplotlib. Did you install "
+                "tweevoortwaalf[interactivegame] optional dependencies "
+                "to play this in a notebook?"
+            ) from e
+
         plt.figure(figsize=(6, 6))
-        plt.imshow(Image.open(buffer))
+        plt.imshow(self.image)
         plt.axis("off")  # Hide the axes
         plt.show()
 
@@ -44,37 +199,27 @@ class PuzzleImage:
 class TaartpuzzleImage(PuzzleImage):
     """Generate the Taartpuzzle image"""
 
-    def __init__(self, letters):
-        super().__init__()
+    def __init__(self, letters, size: Optional[int] = None):
+        super().__init__(size)
         self.letters = letters
-        self.circle_center = (self.width // 2, self.height // 2)
-        self.circle_radius = self.width // 3
-        self.inner_circle_radius = self.width // 10
-        self.angles = np.linspace(0, 2 * np.pi, 9, endpoint=False)
-        self.font = self.load_font()
+        self.layout = get_taartpuzzel_layout(self.width)
+        self.circle_center = (round(self.layout.center), round(self.layout.center))
+        self.font = self.load_font(self.font_size)
+
+    def _circle(self, radius: float) -> Tuple[float, float, float, float]:
+        center = self.layout.center
+        return (center - radius, center - radius, center + radius, center + radius)
 
     def draw_inner_circle(self):
         """Draw the inner circle as an image"""
         self.draw.ellipse(
-            (
-                self.circle_center[0] - self.circle_radius,
-                self.circle_center[1] - self.circle_radius,
-                self.circle_center[0] + self.circle_radius,
-                self.circle_center[1] + self.circle_radius,
-            ),
-            outline="white",
-            width=5,
+            self._circle(self.layout.outer_radius), outline="white", width=5
         )
 
     def draw_outer_circle(self):
         """Draw outer circle in image"""
         self.draw.ellipse(
-            (
-                self.circle_center[0] - self.inner_circle_radius,
-                self.circle_center[1] - self.inner_circle_radius,
-                self.circle_center[0] + self.inner_circle_radius,
-                self.circle_center[1] + self.inner_circle_radius,
-            ),
+            self._circle(self.layout.inner_radius),
             fill="red",
             outline="white",
             width=5,
@@ -82,16 +227,8 @@ class TaartpuzzleImage(PuzzleImage):
 
     def draw_lines(self):
         """Draw the boxes for the letters to appear in"""
-        for angle in self.angles:
-            x_outer = self.circle_center[0] + int(self.circle_radius * np.cos(angle))
-            y_outer = self.circle_center[1] + int(self.circle_radius * np.sin(angle))
-            x_inner = self.circle_center[0] + int(
-                self.inner_circle_radius * np.cos(angle)
-            )
-            y_inner = self.circle_center[1] + int(
-                self.inner_circle_radius * np.sin(angle)
-            )
-            self.draw.line((x_inner, y_inner, x_outer, y_outer), fill="white", width=5)
+        for line in self.layout.lines.round().astype(int).tolist():
+            self.draw.line(line, fill="white", width=5)
 
     def draw_center_text(self):
         """Draw the central text '2V12'."""
@@ -112,78 +249,73 @@ class TaartpuzzleImage(PuzzleImage):
 
     def draw_letters(self):
         """Draw the letters in their respective segments."""
-        for i, letter in enumerate(self.letters):
-            angle = self.angles[i] + np.pi / 9  # Adjust the rotation for centering
-            x = self.circle_center[0] + int(
-                (self.circle_radius + self.inner_circle_radius) / 2 * np.cos(angle)
-            )
-            y = self.circle_center[1] + int(
-                (self.circle_radius + self.inner_circle_radius) / 2 * np.sin(angle)
-            )
-            bbox = self.draw.textbbox((0, 0), letter, font=self.font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
+        atlas = get_glyph_atlas(self.font_size)
+        anchors = self.layout.letters.round().astype(int).tolist()
+        for letter, (x, y) in zip(self.letters, anchors):
+            text_width, text_height = atlas.size(letter)
             if letter == "?":
                 fill_color = "yellow"
             else:
                 fill_color = "white"
-            self.draw.text(
+            atlas.paste(
+                self.image,
                 (x - text_width // 2, y - text_height // 2),
                 letter.upper(),
-                fill=fill_color,
-                font=self.font,
+                fill_color,
             )
 
-    def generate_image(self):
-        """Generate the complete image."""
-
-        # Framework for the puzzle
+    def draw_background(self):
+        """Draw the circles, lines and central text"""
         self.draw_inner_circle()
         self.draw_outer_circle()
         self.draw_lines()
         self.draw_center_text()
 
-        # The puzzle itself
+    def draw_puzzle(self):
+        """Draw the letters"""
         self.draw_letters()
 
 
 class PaardensprongImageGenerator(PuzzleImage):
     """Generates an image of a 3x3 letter puzzle with a central text."""
 
-    def __init__(self, puzzle):
+    def __init__(self, puzzle, size: Optional[int] = None):
         """
         Initialize the image generator.
 
         puzzle must be a 3 x 3 grid of placed letters
         """
-        super().__init__()
+        super().__init__(size)
         self.grid_size = 3
         self.cell_size = self.width // self.grid_size
         self.circle_radius = self.cell_size // 3
         self.letters = puzzle
-        self.font = self.load_font()
+        self.font = self.load_font(self.font_size)
 
-    def draw_grid(self):
-        """Draw the grid lines for the puzzle."""
+    def _cells(self):
         for row in range(self.grid_size):
             for col in range(self.grid_size):
                 if (row, col) != (1, 1):  # Do not draw black letters on the center
-
-                    # draw white background
                     x0 = (col + 0.1) * self.cell_size
                     y0 = (row + 0.1) * self.cell_size
-                    x1 = x0 + self.cell_size * 0.8
-                    y1 = y0 + self.cell_size * 0.8
-                    self.draw.rectangle([x0, y0, x1, y1], fill="white", outline="white")
-
-                    # draw letter
-                    text = self.letters[row][col]
-                    bbox = self.draw.textbbox((0, 0), text, font=self.font)
-                    text_width = bbox[2] - bbox[0]
-                    text_height = bbox[3] - bbox[1]
-                    x = x0 + (self.cell_size * 0.8 - text_width) // 2
-                    y = y0 + (self.cell_size * 0.8 - text_height) // 2
-                    self.draw.text((x, y), text.upper(), fill="black", font=self.font)
+                    yield row, col, x0, y0
+
+    def draw_grid(self):
+        """Draw the white background of every letter."""
+        for _, _, x0, y0 in self._cells():
+            x1 = x0 + self.cell_size * 0.8
+            y1 = y0 + self.cell_size * 0.8
+            self.draw.rectangle([x0, y0, x1, y1], fill="white", outline="white")
+
+    def draw_letters(self):
+        """Draw the letters in the middle of their cell."""
+        atlas = get_glyph_atlas(self.font_size)
+        for row, col, x0, y0 in self._cells():
+            text = self.letters[row][col]
+            text_width, text_height = atlas.size(text)
+            x = x0 + (self.cell_size * 0.8 - text_width) // 2
+            y = y0 + (self.cell_size * 0.8 - text_height) // 2
+            atlas.paste(self.image, (x, y), text.upper(), "black")
 
     def draw_center_text(self):
         """Draw the central text '2V12'."""
@@ -204,7 +336,7 @@ class PaardensprongImageGenerator(PuzzleImage):
 
         # Adjust font size for central text
         central_text = "2V\n12"
-        font = self.load_font(40)
+        font = self.load_font(self.font_size)
         bbox = self.draw.textbbox((0, 0), central_text, font=font)
         text_width = bbox[2] - bbox[0]
         text_height = bbox[3] - bbox[1]
@@ -216,7 +348,94 @@ class PaardensprongImageGenerator(PuzzleImage):
             align="center",
         )
 
-    def generate_image(self):
-        """Generate the complete image."""
+    def draw_background(self):
+        """Draw the grid and the central text"""
         self.draw_grid()
         self.draw_center_text()
+
+    def draw_puzzle(self):
+        """Draw the letters"""
+        self.draw_letters()
+
+
+IMAGE_GENERATORS = {
+    "taartpuzzel": TaartpuzzleImage,
+    "paardensprong": PaardensprongImageGenerator,
+}
+
+
+def render_puzzle_image(
+    puzzlename: str, layout: Any, image_format: str = "png", size: Optional[int] = None
+) -> bytes:
+    """Render a puzzle without displaying it
+
+    Parameters
+    ----------
+    puzzlename : str
+        "taartpuzzel" or "paardensprong"
+    layout : Any
+        The placed letters, as returned by `create_puzzle` of the puzzle
+    image_format : str
+        "png" or "webp"
+    size : Optional[int]
+        Width and height of the image, by default 500 pixels
+    """
+    generator = IMAGE_GENERATORS[puzzlename](layout, size)
+    generator.generate_image()
+    return generator.to_bytes(image_format)
+
+
+class RenderedImageCache:
+    """The most recently used rendered images, keyed on their content
+
+    The key is a hash of the game, the placed letters and the format, so it doubles as
+    ETag: the same board always gets the same key.
+
+    Parameters
+    ----------
+    max_size : int
+        The maximum number of images kept
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._images: collections.OrderedDict = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(puzzlename: str, layout: Any, image_format: str) -> str:
+        """The content address of a rendered board"""
+        content = json.dumps([puzzlename, layout, image_format], ensure_ascii=False)
+        return hashlib.sha1(content.encode()).hexdigest()
+
+    def get(
+        self, puzzlename: str, layout: Any, image_format: str = "png"
+    ) -> Tuple[str, bytes]:
+        """The key and the encoded image, rendered if it is not cached"""
+        key = self.key(puzzlename, layout, image_format)
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return key, image
+            self.misses += 1
+        # Rendering outside the lock; two threads may render the same board at once
+        image = render_puzzle_image(puzzlename, layout, image_format)
+        with self._lock:
+            self._images[key] = image
+            while len(self._images) > self.max_size:
+                self._images.popitem(last=False)
+        return key, image
+
+    def stats(self) -> Dict[str, int]:
+        """Current number of images and counts of hits and misses"""
+        with self._lock:
+            return {
+                "size": self.max_size,
+                "images": len(self._images),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
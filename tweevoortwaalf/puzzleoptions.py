@@ -0,0 +1,147 @@
+"""In-memory cache of the hard mode `puzzleoptions` tables
+
+The options are read from the database once and refreshed in the background after a
+time-to-live. Selecting an option is a local weighted draw in O(log N); marking it as seen is
+applied to the cache immediately and persisted to the database in the background.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import pandas as pd
+from psycopg_pool import ConnectionPool
+
+from .weightedsampler import WeightedSampler
+
+logger = logging.getLogger(__name__)
+
+
+def probability_option(p: float, n: float) -> float:
+    """Get weights, to select options with probability closest to 50%
+
+    Parameters
+    ----------
+    p : float
+        The probability of getting the answer right
+    n : float
+        Power: Higher values make values far from 50% less likely to select
+    """
+    return (p - p**2) ** n
+
+
+class NoPuzzleOptionsException(Exception):
+    """Raised when all puzzle options have been seen"""
+
+
+# pylint: disable=too-many-instance-attributes,too-few-public-methods
+class PuzzleOptionsCache:
+    """Cache of the puzzle options of a single game
+
+    Parameters
+    ----------
+    pool : ConnectionPool
+        The pool to get database connections from
+    name : str
+        The game, which is also the schema of the `puzzleoptions` table
+    ttl : float
+        Number of seconds after which the options are read from the database again
+    n : float
+        Power for the weights, see `probability_option`
+    """
+
+    def __init__(self, pool: ConnectionPool, name: str, ttl: float = 300.0, n=10):
+        self.pool = pool
+        self.name = name
+        self.ttl = ttl
+        self.n = n
+        self._lock = threading.Lock()
+        # A single thread, so updates and refreshes are applied in order
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"puzzleoptions-{name}"
+        )
+        self._refreshing = False
+        self.options: Optional[pd.DataFrame] = None
+        self._set_options(self._read_options())
+
+    def _read_options(self) -> pd.DataFrame:
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT * FROM {self.name}.puzzleoptions;")
+                return pd.DataFrame.from_records(
+                    cur.fetchall(),
+                    columns=[column.name for column in cur.description],
+                    coerce_float=True,
+                )
+
+    def _set_options(self, options: pd.DataFrame) -> None:
+        weights = probability_option(options["probability"].astype(float), n=self.n)
+        rows_by_answer: Dict[str, List[int]] = {}
+        for i, answer in enumerate(options["answer"]):
+            rows_by_answer.setdefault(answer, []).append(i)
+        with self._lock:
+            self.options = options
+            self._sampler = WeightedSampler(weights)
+            self._rows_by_answer = rows_by_answer
+            self._loaded_at = time.monotonic()
+            self._refreshing = False
+
+    def _refresh(self) -> None:
+        try:
+            self._set_options(self._read_options())
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Could not refresh %s puzzle options", self.name)
+            with self._lock:
+                self._refreshing = False
+
+    def _persist_seen(self, answer: str) -> None:
+        query = f"""
+                UPDATE {self.name}.puzzleoptions
+                SET "NTimesWordSeenBefore" = "NTimesWordSeenBefore" + 1,
+                    probability = NULL
+                WHERE answer = %s;
+        """
+        try:
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query, (answer,))
+                conn.commit()
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Could not mark %r as seen", answer)
+
+    def sample(self) -> dict:
+        """Select a puzzle based on probability of getting it wrong, and mark it as seen
+
+        Returns
+        -------
+        dict
+            The answer, direction and startpoint of the puzzle
+        """
+        with self._lock:
+            if not self._refreshing and time.monotonic() - self._loaded_at > self.ttl:
+                self._refreshing = True
+                self._executor.submit(self._refresh)
+
+            if self._sampler.is_empty:
+                raise NoPuzzleOptionsException(
+                    f"All {self.name} options have been seen"
+                )
+            row = self._sampler.sample()
+            chosen_puzzle = self.options.iloc[row]
+            logger.debug(
+                self.options.iloc[self._rows_by_answer[chosen_puzzle["answer"]]]
+            )
+
+            # For now, this word will not be played again until there is a full rerun of
+            # predictions. Its a bit harsh, but good enough
+            for answer_row in self._rows_by_answer[chosen_puzzle["answer"]]:
+                self._sampler.update(answer_row, 0)
+
+        self._executor.submit(self._persist_seen, chosen_puzzle["answer"])
+        return {
+            "answer": chosen_puzzle["answer"],
+            "direction": int(chosen_puzzle["direction"]),
+            "startpoint": int(chosen_puzzle["startpoint"]),
+        }
@@ -0,0 +1,125 @@
+"""Bounded pool of ready-to-serve puzzles, topped up by a background thread"""
+
+import collections
+import logging
+import threading
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+# pylint: disable=too-many-instance-attributes
+class PuzzlePool(Generic[T]):
+    """Keep up to `size` puzzles ready, so creating one is off the request path
+
+    When fewer than `refill_threshold` puzzles are left, a background thread creates
+    new ones until the pool is full again. When the pool is empty, a puzzle is created
+    on the spot (a miss).
+
+    Parameters
+    ----------
+    factory : Callable[[], T]
+        Creates a new puzzle
+    size : int
+        The maximum number of puzzles kept ready; 0 disables the pool
+    refill_threshold : int
+        Start refilling when fewer puzzles than this are left
+    name : str
+        Name of the pool, for logging and the refill thread
+    batch_factory : Optional[Callable[[int], List[T]]]
+        Creates the given number of puzzles at once, for refilling when that is
+        cheaper than calling `factory` repeatedly
+    """
+
+    # Seconds to wait before refilling again after the factory failed
+    retry_delay = 1.0
+
+    def __init__(
+        self,
+        factory: Callable[[], T],
+        size: int = 20,
+        refill_threshold: int = 10,
+        name: str = "puzzlepool",
+        batch_factory: Optional[Callable[[int], List[T]]] = None,
+    ):
+        if refill_threshold > size:
+            raise ValueError(
+                f"refill_threshold ({refill_threshold}) can not exceed size ({size})"
+            )
+        self.factory = factory
+        self.batch_factory = batch_factory
+        self.size = size
+        self.refill_threshold = refill_threshold
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.refill_errors = 0
+        self._puzzles: collections.deque = collections.deque()
+        self._lock = threading.Lock()
+        self._refill_needed = threading.Event()
+        self._stop = threading.Event()
+        if size > 0:
+            threading.Thread(
+                target=self._refill, name=f"{name}-refill", daemon=True
+            ).start()
+            self._refill_needed.set()
+
+    def get(self) -> T:
+        """Take a puzzle from the pool, or create one if the pool is empty"""
+        with self._lock:
+            try:
+                puzzle = self._puzzles.popleft()
+                self.hits += 1
+            except IndexError:
+                puzzle = None
+                self.misses += 1
+            if len(self._puzzles) < self.refill_threshold:
+                self._refill_needed.set()
+        if puzzle is None:
+            return self.factory()
+        return puzzle
+
+    def stats(self) -> Dict[str, int]:
+        """Current number of puzzles ready and counts of hits, misses and errors"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "available": len(self._puzzles),
+                "hits": self.hits,
+                "misses": self.misses,
+                "refill_errors": self.refill_errors,
+            }
+
+    def close(self) -> None:
+        """Stop refilling the pool"""
+        self._stop.set()
+        self._refill_needed.set()
+
+    def _refill(self) -> None:
+        while True:
+            self._refill_needed.wait()
+            if self._stop.is_set():
+                return
+            while len(self._puzzles) < self.size and not self._stop.is_set():
+                try:
+                    puzzles = self._create(self.size - len(self._puzzles))
+                except Exception:  # pylint: disable=broad-exception-caught
+                    logger.exception("Could not create puzzle for %s", self.name)
+                    with self._lock:
+                        self.refill_errors += 1
+                    # Back off, instead of failing in a tight loop
+                    self._stop.wait(self.retry_delay)
+                    break
+                with self._lock:
+                    self._puzzles.extend(puzzles)
+            self._refill_needed.clear()
+            # A puzzle may have been taken after the last check
+            if len(self._puzzles) < self.refill_threshold:
+                self._refill_needed.set()
+
+    def _create(self, n: int) -> List[T]:
+        if self.batch_factory is None:
+            return [self.factory()]
+        return self.batch_factory(n)
@@ -1,80 +1,156 @@
-"""Write files for acceptable words for Twee voor Twaalf for each game type"""
+"""Write files for acceptable words for Twee voor Twaalf for each game type
 
-from typing import Set
+The source list is read in chunks and every suitable word is keyed once: by its
+lexicographically smallest rotation for the games in which the word is read around a
+circle, and by its sorted letters for the woordrader. Only one word per key is kept,
+so memory depends on the number of suitable words, not on the size of the source list,
+and all output files are written after a single pass.
+
+Run from the root of the repository as `python -m tweevoortwaalf.suitablewordselection`
+"""
+
+import argparse
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
 
 import pandas as pd
 
+from .wordindex import anagram_signature, canonical_rotation, rotate
+
+SUITABILITY_COLS = [
+    "AllLowercase",
+    "AllBasicAlpha",
+    "ZelfstandigNaamwoord",
+    "IsEnkelvoud",
+]
+# All words a player could guess in the woordrader, used to check for anagrams
+VOCABULARY_COLS = ["AllLowercase", "AllBasicAlpha"]
+VOCABULARY_LENGTH = 12
+
 
 def generate_rotations(word: str) -> Set[str]:
     """Generate all rotations for a word"""
-    return {word[i:] + word[:i] for i in range(len(word))}
+    return {rotate(word, i) for i in range(len(word))}
 
 
-def remove_rotated_duplicates(series: pd.Series) -> pd.Series:
-    """Filter out all words that also occur rotated"""
-    rotation_map = {}
-
-    for word in series:
-        rotations = generate_rotations(word)
-        for rotation in rotations:
-            if rotation in rotation_map:
-                rotation_map[rotation].add(word)
-            else:
-                rotation_map[rotation] = {word}
-
-    unique_words = [
-        word
-        for word in series
-        if all(
-            len(rotation_map[rotation]) == 1 for rotation in generate_rotations(word)
-        )
-    ]
-    return pd.Series(unique_words)
+class UniqueWords:
+    """Keeps the words that no other word shares a key with
 
+    Parameters
+    ----------
+    key : Callable[[str], str]
+        E.g. `canonical_rotation` or `anagram_signature`
+    """
 
-def remove_anagrams(series: pd.Series) -> pd.Series:
-    """Remove all words from a series that also occur as an anagram"""
-    anagram_map = {}
+    def __init__(self, key: Callable[[str], str]):
+        self.key = key
+        # The only word with the key so far, or None once a second word has it
+        self._words: Dict[str, Optional[str]] = {}
 
-    for word in series:
-        sorted_word = "".join(sorted(word))
-        if sorted_word in anagram_map:
-            anagram_map[sorted_word].add(word)
-        else:
-            anagram_map[sorted_word] = {word}
+    def add(self, word: str) -> str:
+        """Add a word, returns its key"""
+        key = self.key(word)
+        first = self._words.setdefault(key, word)
+        if first is not None and first != word:
+            self._words[key] = None
+        return key
 
-    unique_words = [
-        word for word in series if len(anagram_map["".join(sorted(word))]) == 1
-    ]
+    def is_unique(self, key: str) -> bool:
+        """Whether exactly one word has this key"""
+        return self._words.get(key) is not None
 
-    return pd.Series(unique_words)
+    def __iter__(self) -> Iterator[str]:
+        return (word for word in self._words.values() if word is not None)
 
 
-def main():
-    """Write files for acceptable words for Twee voor Twaalf for each game type"""
-    suitability_cols = [
-        "AllLowercase",
-        "AllBasicAlpha",
-        "ZelfstandigNaamwoord",
-        "IsEnkelvoud",
-    ]
-    df = (
-        pd.read_csv("Data/wordlist.csv")
-        .assign(Suitable=lambda df: df[suitability_cols].fillna(False).all("columns"))
-        .query("Suitable")
+def _remove_shared_keys(series: pd.Series, key: Callable[[str], str]) -> pd.Series:
+    unique_words = UniqueWords(key)
+    keys = [unique_words.add(word) for word in series]
+    return pd.Series(
+        [word for word, k in zip(series, keys) if unique_words.is_unique(k)]
     )
 
-    for n_letters in (8, 9, 12):
-        suitable_words = df.query("Length == @n_letters")["Word"]
-        if n_letters in (8, 9):
-            suitable_words = remove_rotated_duplicates(suitable_words)
-        if n_letters == 12:
-            suitable_words = remove_anagrams(suitable_words)
-        suitable_words.to_csv(
-            f"../Output/suitable_{n_letters}_letter_words.txt",
-            index=False,
-            header=False,
+
+def remove_rotated_duplicates(series: pd.Series) -> pd.Series:
+    """Filter out all words that also occur rotated"""
+    return _remove_shared_keys(series, canonical_rotation)
+
+
+def remove_anagrams(series: pd.Series) -> pd.Series:
+    """Remove all words from a series that also occur as an anagram"""
+    return _remove_shared_keys(series, anagram_signature)
+
+
+class WordListBuilder:
+    """Collects the suitable words and the vocabulary from chunks of the source list"""
+
+    def __init__(self):
+        self.suitable = {
+            8: UniqueWords(canonical_rotation),
+            9: UniqueWords(canonical_rotation),
+            12: UniqueWords(anagram_signature),
+        }
+        # Ordered and without duplicates
+        self.vocabulary: Dict[str, None] = {}
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        """Add a chunk of the source list"""
+        length = chunk["Length"]
+        in_vocabulary = chunk[VOCABULARY_COLS].eq(True).all("columns")
+        suitable = chunk[SUITABILITY_COLS].eq(True).all("columns")
+
+        vocabulary = chunk.loc[in_vocabulary & (length == VOCABULARY_LENGTH), "Word"]
+        self.vocabulary.update(dict.fromkeys(vocabulary))
+        for n_letters, unique_words in self.suitable.items():
+            for word in chunk.loc[suitable & (length == n_letters), "Word"]:
+                unique_words.add(word)
+
+    def write(self, output_dir: str) -> None:
+        """Write the vocabulary and the suitable words per length"""
+        _write_words(
+            os.path.join(
+                output_dir, f"vocabulary_{VOCABULARY_LENGTH}_letter_words.txt"
+            ),
+            self.vocabulary,
         )
+        for n_letters, unique_words in self.suitable.items():
+            _write_words(
+                os.path.join(output_dir, f"suitable_{n_letters}_letter_words.txt"),
+                unique_words,
+            )
+
+
+def _write_words(path: str, words: Iterable[str]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for word in words:
+            f.write(word + "\n")
+
+
+def build_word_lists(
+    source: str = "Data/wordlist.csv",
+    output_dir: str = "../Output",
+    chunksize: int = 1_000_000,
+) -> WordListBuilder:
+    """Read the source list in chunks and write all word lists"""
+    usecols: List[str] = ["Word", "Length", *SUITABILITY_COLS]
+    builder = WordListBuilder()
+    with pd.read_csv(source, usecols=usecols, chunksize=chunksize) as reader:
+        for chunk in reader:
+            builder.add(chunk)
+    builder.write(output_dir)
+    return builder
+
+
+def main(argv=None):
+    """Write files for acceptable words for Twee voor Twaalf for each game type"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", default="Data/wordlist.csv")
+    parser.add_argument("--output-dir", default="../Output")
+    parser.add_argument(
+        "--chunksize", type=int, default=1_000_000, help="Rows read at a time"
+    )
+    args = parser.parse_args(argv)
+    build_word_lists(args.source, args.output_dir, args.chunksize)
 
 
 if __name__ == "__main__":
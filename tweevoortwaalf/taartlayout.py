@@ -0,0 +1,81 @@
+"""Geometry of the taartpuzzel board, shared by the image and the web page
+
+The positions of the lines between the segments and of the letters are computed once
+per size, with numpy, so neither renderer does any trigonometry per puzzle and both
+draw the same board. Angles are clockwise from the top, the first letter is in the
+segment right of the top line.
+"""
+
+import functools
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+N_SEGMENTS = 9
+# As fraction of the size of the board
+OUTER_RADIUS = 0.5
+INNER_RADIUS = 0.1
+LETTER_RADIUS = 0.35
+
+
+@dataclass(frozen=True)
+class TaartpuzzelLayout:
+    """Positions on a square board of `size` pixels
+
+    Attributes
+    ----------
+    size : int
+        Width and height of the board
+    center : float
+        The x and y coordinate of the center
+    outer_radius, inner_radius : float
+        The radius of the circle around the board and of the central circle
+    lines : np.ndarray
+        Per line between segments: x and y on the outer circle, then on the inner one
+    letters : np.ndarray
+        Per segment: x and y of the middle of its letter
+    """
+
+    size: int
+    center: float
+    outer_radius: float
+    inner_radius: float
+    lines: np.ndarray
+    letters: np.ndarray
+
+    @property
+    def svg_lines(self) -> List[Tuple[str, str, str, str]]:
+        """The lines as SVG coordinates: x1, y1, x2, y2"""
+        return [tuple(f"{value:.1f}" for value in line) for line in self.lines]
+
+    @property
+    def svg_letters(self) -> List[Tuple[str, str]]:
+        """The middle of the letters as SVG coordinates: x, y"""
+        return [tuple(f"{value:.1f}" for value in letter) for letter in self.letters]
+
+
+def _points(center: float, radius: float, angles: np.ndarray) -> np.ndarray:
+    return np.column_stack(
+        [center + radius * np.sin(angles), center - radius * np.cos(angles)]
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_taartpuzzel_layout(size: int = 500) -> TaartpuzzelLayout:
+    """Get the layout of a board of `size` pixels, computed on first use"""
+    center = size / 2
+    line_angles = np.arange(N_SEGMENTS) * 2 * np.pi / N_SEGMENTS
+    letter_angles = line_angles + np.pi / N_SEGMENTS
+    lines = np.hstack(
+        [
+            _points(center, OUTER_RADIUS * size, line_angles),
+            _points(center, INNER_RADIUS * size, line_angles),
+        ]
+    )
+    letters = _points(center, LETTER_RADIUS * size, letter_angles)
+    for array in (lines, letters):
+        array.flags.writeable = False
+    return TaartpuzzelLayout(
+        size, center, OUTER_RADIUS * size, INNER_RADIUS * size, lines, letters
+    )
@@ -1,8 +1,12 @@
 """Generate the Taartpuzzle image and show it"""
 
+import datetime
 import random
 
+import pandas as pd
+
 from .woordpuzzel import SmallWoordpuzzelMixin, Woordpuzzel
+from .wordindex import WildcardRotationIndex, get_wildcard_rotation_index
 
 
 class Taartpuzzel(Woordpuzzel, SmallWoordpuzzelMixin):
@@ -13,47 +17,44 @@ class Taartpuzzel(Woordpuzzel, SmallWoordpuzzelMixin):
     def __init__(
         self, direction=None, startpoint=None, missing_letter_index=None, answer=None
     ):
-        super().__init__(answer=answer)
-        SmallWoordpuzzelMixin.__init__(self, direction=direction, startpoint=startpoint)
-
         if missing_letter_index is not None:
             if missing_letter_index not in range(self.n_letters):
                 raise ValueError(
                     f"missing_letter_index must be in range(9), not {missing_letter_index}"
                 )
-            self.missing_letter_index = missing_letter_index
-        else:
+        # Set before selecting the answer, so the selection can take it into account
+        self.missing_letter_index = missing_letter_index
+
+        super().__init__(answer=answer)
+        SmallWoordpuzzelMixin.__init__(self, direction=direction, startpoint=startpoint)
+
+        # self.missing_letter_index can be 0, so boolean check does not work
+        if self.missing_letter_index is None:
             self.missing_letter_index = random.choice(range(self.n_letters))
 
-    def unique_solution(self):
-        """Rotations can not lead to an alternative solution"""
-        otherwords = self.wordlist
-        pattern = (
-            self.answer[: self.missing_letter_index]
-            + "."
-            + self.answer[self.missing_letter_index + 1 :]
+    @property
+    def wildcard_index(self) -> WildcardRotationIndex:
+        """The shared index of words fitting each taartpuzzel"""
+        return get_wildcard_rotation_index(self.n_letters)
+
+    def select_puzzle(self):
+        """Selects an answer and missing letter that have a unique solution"""
+        self.answer, self.missing_letter_index = self.wildcard_index.sample_unique(
+            self.missing_letter_index
         )
+        self.start_time = datetime.datetime.now()  # TODO: move to create_puzzle
 
-        def rotate(strg, n):
-            """Start at a different position
-
-            Parameters
-            ----------
-            strg : str
-                The string to be rotated
-            n : int
-                The number of places to rotate; must be less than or equal to length of wrd
-            """
-            return strg[n:] + strg[:n]
-
-        n_options = []
-        options = []
-        for i in range(len(self.answer)):
-            pat = rotate(pattern, i)
-            matching = otherwords.str.match(pat)
-            options.append(otherwords[matching])
-            n_options.append(otherwords.str.match(pat).sum())
-        return sum(n_options) == 1
+    @classmethod
+    def unique_options(cls) -> pd.DataFrame:
+        """All combinations of answer and missing letter with a unique solution"""
+        return pd.DataFrame(
+            get_wildcard_rotation_index(cls.n_letters).unique_options,
+            columns=["answer", "missing_letter_index"],
+        )
+
+    def unique_solution(self):
+        """Rotations can not lead to an alternative solution"""
+        return self.wildcard_index.is_unique(self.answer, self.missing_letter_index)
 
     def create_puzzle(self):
         """Create the puzzle as list of letter with correct placement"""
@@ -0,0 +1,100 @@
+"""Weighted random sampling with updatable weights"""
+
+import random
+from typing import Iterable, Optional
+
+
+class WeightedSampler:
+    """Draw indices with probability proportional to their weight
+
+    The weights are kept in a Fenwick tree (binary indexed tree), so both drawing an
+    index and changing a weight take O(log N), where N is the number of weights.
+
+    Parameters
+    ----------
+    weights : Iterable[float]
+        Non-negative weights; missing values (NaN) count as 0
+    rng : Optional[random.Random]
+        Random number generator to draw with; the `random` module if None
+    """
+
+    def __init__(self, weights: Iterable[float], rng: Optional[random.Random] = None):
+        self.weights = [self._clean(weight) for weight in weights]
+        self.rng = rng or random
+        self._n = len(self.weights)
+        self._n_positive = sum(weight > 0 for weight in self.weights)
+        self._top_bit = 1 << (self._n.bit_length() - 1) if self._n else 0
+        self._build()
+
+    def _build(self) -> None:
+        """Build the tree in O(N) by adding every node to its parent"""
+        self._tree = [0.0] + self.weights
+        for i in range(1, self._n + 1):
+            parent = i + (i & -i)
+            if parent <= self._n:
+                self._tree[parent] += self._tree[i]
+
+    @staticmethod
+    def _clean(weight: float) -> float:
+        weight = float(weight)
+        if weight != weight:  # pylint: disable=comparison-with-itself
+            return 0.0
+        if weight < 0:
+            raise ValueError(f"Weights must be non-negative, not {weight}")
+        return weight
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def is_empty(self) -> bool:
+        """Whether all weights are 0, so nothing can be drawn"""
+        return self._n_positive == 0
+
+    @property
+    def total(self) -> float:
+        """The sum of all weights"""
+        total = 0.0
+        i = self._n
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def update(self, index: int, weight: float) -> None:
+        """Set the weight of `index` to `weight`"""
+        weight = self._clean(weight)
+        delta = weight - self.weights[index]
+        self._n_positive += (weight > 0) - (self.weights[index] > 0)
+        self.weights[index] = weight
+        i = index + 1
+        while i <= self._n:
+            self._tree[i] += delta
+            i += i & -i
+
+    def sample(self) -> int:
+        """Draw an index with probability proportional to its weight"""
+        if self.is_empty:
+            raise ValueError("Can not sample: all weights are 0")
+        position = self._descend(self.rng.random())
+        if position == self._n or self.weights[position] == 0:
+            # Updates leave rounding errors in the tree, which matter when weights are
+            # small compared to the weights that were removed: rebuild and draw again
+            self._build()
+            position = self._descend(self.rng.random())
+        if position == self._n or self.weights[position] == 0:
+            position = max(i for i, weight in enumerate(self.weights) if weight > 0)
+        return position
+
+    def _descend(self, fraction: float) -> int:
+        """Find the first index whose cumulative weight exceeds `fraction` of the total"""
+        target = fraction * self.total
+        position = 0
+        step = self._top_bit
+        while step:
+            nxt = position + step
+            if nxt <= self._n and self._tree[nxt] <= target:
+                position = nxt
+                target -= self._tree[nxt]
+            step >>= 1
+        return position
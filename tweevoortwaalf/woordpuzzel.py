@@ -3,14 +3,16 @@
 import abc
 import csv
 import datetime
-import importlib
 import os
 import random
 from dataclasses import dataclass, field
 from typing import Optional
 
+import numpy as np
 import pandas as pd
 
+from .wordstore import WordStore, get_wordstore
+
 
 class NonUniqueQuizException(Exception):
     """Raised when a puzzle has multiple solutions"""
@@ -37,18 +39,37 @@ class Woordpuzzel:
         self.guess = None
         self.correct = None
 
+    @classmethod
+    def from_catalogue(cls, **kwargs) -> "Woordpuzzel":
+        """Create a puzzle from a random configuration with a unique solution
+
+        The configuration is drawn from the precomputed catalogue, in constant time
+        """
+        # pylint: disable=import-outside-toplevel,cyclic-import
+        from .catalogue import get_catalogue
+
+        # pylint: enable=import-outside-toplevel,cyclic-import
+        return cls(**get_catalogue(cls).sample(), **kwargs)
+
     @property
     @abc.abstractmethod
     def n_letters(self) -> int:
         """The number of letters in the puzzle"""
 
+    @property
+    def wordstore(self) -> WordStore:
+        """The shared, in-memory store of all suitable words"""
+        return get_wordstore(self.n_letters)
+
     @property
     def wordlist(self) -> pd.Series:
         """Get all suitable words"""
-        data_path = importlib.resources.files("tweevoortwaalf.Data").joinpath(
-            f"suitable_{self.n_letters}_letter_words.txt"
-        )
-        return pd.read_csv(data_path).squeeze()
+        return self.wordstore.series
+
+    @property
+    def candidate_words(self) -> np.ndarray:
+        """The words from which a puzzle answer is selected"""
+        return self.wordstore.words
 
     @abc.abstractmethod
     def unique_solution(self):
@@ -65,7 +86,7 @@ class Woordpuzzel:
 
     def select_puzzle(self):
         """Selects the puzzle answer"""
-        self.answer = self.wordlist.sample(1).squeeze()
+        self.answer = str(random.choice(self.candidate_words))
         self.start_time = datetime.datetime.now()  # TODO: move to create_puzzle
 
     def _write_to_file(self):
@@ -1,10 +1,17 @@
 """Class to play the woordrader game from twee voor twaalf"""
 
 import datetime
+import itertools
+import logging
 import random
-from typing import List, Tuple
+from typing import List, Optional, Sequence, Tuple
 
-from .woordpuzzel import Woordpuzzel
+import numpy as np
+
+from .woordpuzzel import NonUniqueQuizException, Woordpuzzel
+from .wordindex import AnagramIndex, get_anagram_index
+
+logger = logging.getLogger(__name__)
 
 LETTER_OCCURENCE_FIRST_POSITION = {  # based on words of all length
     "b": 0.09775666589860389,
@@ -36,13 +43,351 @@ LETTER_OCCURENCE_FIRST_POSITION = {  # based on words of all length
     "x": 0.00020087795482609286,
 }
 
+WRONG_LETTERS = list(LETTER_OCCURENCE_FIRST_POSITION)
+WRONG_LETTER_CUM_WEIGHTS = list(
+    itertools.accumulate(LETTER_OCCURENCE_FIRST_POSITION.values())
+)
+# For drawing many wrong letters at once with a binary search
+_WRONG_LETTER_ARRAY = np.array(WRONG_LETTERS)
+_WRONG_LETTER_CDF = np.array(WRONG_LETTER_CUM_WEIGHTS) / WRONG_LETTER_CUM_WEIGHTS[-1]
+
+# Starting positions are regenerated when they are ambiguous, which is the case for
+# every starting position if the answer itself has an anagram
+MAX_STARTING_POSITION_ATTEMPTS = 100
+# A random answer is replaced when none of its starting positions was unique, which
+# only happens for settings in which few letters are shown correctly
+MAX_ANSWER_ATTEMPTS = 10
+
+
+class WoordRaderState:
+    """The letters of a woordrader game, in fixed-size tuples indexed by quiz position
+
+    The quiz position is the place of a letter in the top row, the answer position its
+    place in the answer (and the bottom row). Both permutations are stored, so mapping
+    either way is a lookup. Which letters are correct and bought are kept as bitmasks.
+
+    Parameters
+    ----------
+    answer : str
+        The word to guess
+    answer_position : Sequence[int]
+        For every quiz position, the position of its letter in the answer
+    shown : Sequence[str]
+        For every quiz position, the letter shown: the true letter, a wrong letter or
+        "-" if unknown
+    correct : int
+        Bitmask of the quiz positions that show their true letter
+    bought : int
+        Bitmask of the quiz positions that have been bought
+    """
+
+    __slots__ = (
+        "answer",
+        "answer_position",
+        "quiz_position",
+        "shown",
+        "correct",
+        "bought",
+    )
+
+    def __init__(
+        self,
+        answer: str,
+        answer_position: Sequence[int],
+        shown: Sequence[str],
+        correct: int,
+        bought: int = 0,
+    ):  # pylint: disable=too-many-arguments
+        if sorted(answer_position) != list(range(len(answer))):
+            raise ValueError("answer_position must be a permutation of the answer")
+        if len(shown) != len(answer):
+            raise ValueError(f"Need {len(answer)} shown letters, not {len(shown)}")
+        self.answer = answer
+        self.answer_position = tuple(answer_position)
+        quiz_position = [0] * len(answer)
+        for quizposition, position in enumerate(self.answer_position):
+            quiz_position[position] = quizposition
+        self.quiz_position = tuple(quiz_position)
+        self.shown = tuple(shown)
+        self.correct = correct
+        self.bought = bought
+
+    def __len__(self) -> int:
+        return len(self.answer)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, WoordRaderState):
+            return NotImplemented
+        return self.to_compact() == other.to_compact()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}.from_compact({self.to_compact()!r})"
+
+    def __reduce__(self):
+        return self.__class__.from_compact, (self.to_compact(),)
+
+    def is_correct(self, quizposition: int) -> bool:
+        """Whether the letter at this quiz position is the true letter"""
+        return bool(self.correct >> quizposition & 1)
+
+    def is_bought(self, quizposition: int) -> bool:
+        """Whether the letter at this quiz position has been bought"""
+        return bool(self.bought >> quizposition & 1)
+
+    def true_letter(self, quizposition: int) -> str:
+        """The letter of the answer that belongs at this quiz position"""
+        return self.answer[self.answer_position[quizposition]]
+
+    def correct_letters(self) -> List[str]:
+        """All letters that are shown correctly"""
+        return [
+            self.shown[quizposition]
+            for quizposition in range(len(self))
+            if self.correct >> quizposition & 1
+        ]
+
+    def buy(self, quizposition: int) -> Tuple[int, str]:
+        """Buy the letter at this quiz position
+
+        Returns
+        -------
+            answer_position : int
+                The position where the letter lands in the bottom row
+            letter : str
+                The true letter, or "?" if the shown letter was wrong
+        """
+        if self.bought >> quizposition & 1:
+            raise ValueError(f"{quizposition + 1} already bought!")
+        self.bought |= 1 << quizposition
+        letter = (
+            self.true_letter(quizposition) if self.is_correct(quizposition) else "?"
+        )
+        return self.answer_position[quizposition], letter
+
+    def top_row(self) -> List[str]:
+        """The shown letters by quiz position, empty strings for bought letters"""
+        return [
+            "" if self.bought >> quizposition & 1 else letter
+            for quizposition, letter in enumerate(self.shown)
+        ]
+
+    def bottom_row(self) -> List[str]:
+        """The bought letters by answer position: the true letter, or "?" if wrong
+
+        Empty strings for letters that are not bought
+        """
+        row = []
+        for answer_position, quizposition in enumerate(self.quiz_position):
+            if not self.bought >> quizposition & 1:
+                row.append("")
+            elif self.correct >> quizposition & 1:
+                row.append(self.answer[answer_position])
+            else:
+                row.append("?")
+        return row
+
+    def to_compact(self) -> str:
+        """A short string from which `from_compact` recreates the state
+
+        The answer, the permutation (a hex digit per quiz position), the correct and
+        bought bitmasks in hex and the shown letters of the incorrect positions, since
+        the correct ones follow from the answer. For example
+        `"bloemkoolsoep|4a0b73859162|fdf|000|-"` for a game with one unknown letter
+        """
+        wrong = [
+            letter
+            for quizposition, letter in enumerate(self.shown)
+            if not self.correct >> quizposition & 1
+        ]
+        return "|".join(
+            [
+                self.answer,
+                "".join(f"{position:x}" for position in self.answer_position),
+                f"{self.correct:x}",
+                f"{self.bought:x}",
+                ",".join(wrong),
+            ]
+        )
+
+    @classmethod
+    def from_compact(cls, compact: str) -> "WoordRaderState":
+        """Recreate a state from the output of `to_compact`"""
+        answer, permutation, correct, bought, wrong = compact.split("|")
+        answer_position = [int(position, 16) for position in permutation]
+        correct_mask = int(correct, 16)
+        wrong_letters = iter(wrong.split(",") if wrong else [])
+        shown = [
+            (
+                answer[answer_position[quizposition]]
+                if correct_mask >> quizposition & 1
+                else next(wrong_letters)
+            )
+            for quizposition in range(len(answer))
+        ]
+        return cls(answer, answer_position, shown, correct_mask, int(bought, 16))
+
+
+class StartingPositions:
+    """A batch of woordrader starting positions as arrays, with a row per game
+
+    Parameters
+    ----------
+    answers : Sequence[str]
+        The answer of every game
+    answer_position : np.ndarray
+        For every game and quiz position, the position of its letter in the answer
+    shown : np.ndarray
+        For every game and quiz position, the letter shown
+    correct : np.ndarray
+        For every game and quiz position, whether the shown letter is the true letter
+    """
+
+    def __init__(
+        self,
+        answers: Sequence[str],
+        answer_position: np.ndarray,
+        shown: np.ndarray,
+        correct: np.ndarray,
+    ):
+        self.answers = list(answers)
+        self.answer_position = answer_position
+        self.shown = shown
+        self.correct = correct
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+    def states(self) -> List[WoordRaderState]:
+        """The starting position of every game"""
+        n_letters = self.correct.shape[1]
+        masks = (self.correct.astype(np.int64) << np.arange(n_letters)).sum(axis=1)
+        return [
+            WoordRaderState(answer, answer_position, shown, int(mask))
+            for answer, answer_position, shown, mask in zip(
+                self.answers,
+                self.answer_position.tolist(),
+                self.shown.tolist(),
+                masks.tolist(),
+            )
+        ]
+
+
+def generate_starting_positions(
+    answers: Sequence[str],
+    p_wrong: float = 0.05,
+    p_unknown: float = 0.05,
+    rng: Optional[np.random.Generator] = None,
+) -> StartingPositions:
+    """Generate a starting position for each answer at once
+
+    Every letter is independently wrong with probability `p_wrong` (replaced by a
+    letter drawn from LETTER_OCCURENCE_FIRST_POSITION) or unknown with probability
+    `p_unknown`, and the letters are shuffled. Pass the same answer several times to
+    get several starting positions for it.
+
+    Parameters
+    ----------
+    answers : Sequence[str]
+        The answers, all of the same length
+    p_wrong : float
+        The probability a letter is shown wrong
+    p_unknown : float
+        The probability a letter is shown as unknown ("-")
+    rng : Optional[np.random.Generator]
+        The random number generator; if None, one seeded from the `random` module,
+        so seeding `random` makes the positions reproducible
+    """
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+    letters = np.array([list(answer) for answer in answers], dtype="<U2")
+    if letters.ndim != 2:
+        raise ValueError("All answers must have the same length")
+    n_games, n_letters = letters.shape
+
+    # One draw per letter decides whether it is wrong, unknown or correct
+    draws = rng.random((n_games, n_letters))
+    wrong = draws < p_wrong
+    unknown = ~wrong & (draws < p_wrong + p_unknown)
+    shown_by_answer = letters.copy()
+    shown_by_answer[unknown] = "-"
+    wrong_letters = np.searchsorted(
+        _WRONG_LETTER_CDF, rng.random(int(wrong.sum())), side="right"
+    )
+    shown_by_answer[wrong] = _WRONG_LETTER_ARRAY[
+        np.minimum(wrong_letters, len(_WRONG_LETTER_ARRAY) - 1)
+    ]
+
+    # A random permutation per game: the answer position of every quiz position
+    answer_position = np.argsort(rng.random((n_games, n_letters)), axis=1)
+    return StartingPositions(
+        answers,
+        answer_position,
+        np.take_along_axis(shown_by_answer, answer_position, axis=1),
+        np.take_along_axis(~(wrong | unknown), answer_position, axis=1),
+    )
+
+
+def is_unique_starting_position(
+    state: WoordRaderState, anagram_index: AnagramIndex
+) -> bool:
+    """Whether no other word contains all correctly shown letters"""
+    return not anagram_index.has_other_words_containing(
+        state.answer, state.correct_letters()
+    )
+
+
+def generate_unique_starting_positions(
+    answers: Sequence[str],
+    p_wrong: float = 0.05,
+    p_unknown: float = 0.05,
+    rng: Optional[np.random.Generator] = None,
+) -> List[WoordRaderState]:
+    """Generate a starting position for each answer at once, as the game would
+
+    Like creating puzzles one by one, starting positions in which another word fits the
+    correctly shown letters are regenerated, for at most MAX_STARTING_POSITION_ATTEMPTS
+    rounds. Answers that are still ambiguous after that are left out, so fewer states
+    than answers may be returned. See `generate_starting_positions` for the parameters.
+    """
+    if not answers:
+        return []
+    anagram_index = get_anagram_index(len(answers[0]))
+    states: List[Optional[WoordRaderState]] = [None] * len(answers)
+    todo = list(range(len(answers)))
+    for _ in range(MAX_STARTING_POSITION_ATTEMPTS):
+        positions = generate_starting_positions(
+            [answers[i] for i in todo], p_wrong, p_unknown, rng
+        )
+        ambiguous = []
+        for i, state in zip(todo, positions.states()):
+            if is_unique_starting_position(state, anagram_index):
+                states[i] = state
+            else:
+                ambiguous.append(i)
+        todo = ambiguous
+        if not todo:
+            break
+    if todo:
+        logger.warning(
+            "No unique starting position for %s answers, leaving them out", len(todo)
+        )
+    return [state for state in states if state is not None]
+
 
 class WoordRader(Woordpuzzel):
     """Class to play the woordrader game from twee voor twaalf"""
 
     n_letters = 12
 
-    def __init__(self, answer=None, p_wrong=0.05, p_unknown=0.05):
+    def __init__(
+        self,
+        answer=None,
+        p_wrong=0.05,
+        p_unknown=0.05,
+        state: Optional[WoordRaderState] = None,
+    ):
+        if state is not None:
+            answer = state.answer
         super().__init__(answer=answer)
 
         if p_wrong > 1 or p_wrong < 0:
@@ -56,14 +401,21 @@ class WoordRader(Woordpuzzel):
             )
         self.p_unknown = p_unknown
 
-        self._generate_starting_position()
+        if state is not None:
+            self.state = state
+        elif answer is not None:
+            self._generate_unique_starting_position()
+        else:
+            self._generate_unique_starting_position_any_answer()
 
         self.guess = None
         self.start_time = None
         self.guesstime = None
 
     def _generate_starting_position(self):
-        state = {}
+        answer_positions = [0] * self.n_letters
+        shown = [""] * self.n_letters
+        correct_mask = 0
 
         quizpositions = random.sample(range(self.n_letters), self.n_letters)
         for answer_position, (letter, quizposition) in enumerate(
@@ -72,33 +424,102 @@ class WoordRader(Woordpuzzel):
             random_nr = random.random()
             if random_nr < self.p_wrong:
                 shown_letter = random.choices(
-                    list(LETTER_OCCURENCE_FIRST_POSITION.keys()),
-                    list(LETTER_OCCURENCE_FIRST_POSITION.values()),
+                    WRONG_LETTERS, cum_weights=WRONG_LETTER_CUM_WEIGHTS
                 )[0]
                 correct = False
-            elif self.p_wrong < random_nr < self.p_wrong + self.p_unknown:
+            elif random_nr < self.p_wrong + self.p_unknown:
                 shown_letter = "-"
                 correct = False
             else:
                 shown_letter = letter
                 correct = True
-            state[quizposition] = {
-                "shown_letter": shown_letter,
-                "answer_position": answer_position,
-                "bought": False,
-                "correct": correct,
-                "true_letter": letter,
-            }
-        self.state = state
+            answer_positions[quizposition] = answer_position
+            shown[quizposition] = shown_letter
+            correct_mask |= correct << quizposition
+        # pylint: disable-next=attribute-defined-outside-init
+        self.state = WoordRaderState(self.answer, answer_positions, shown, correct_mask)
+
+    def _generate_unique_starting_position(self):
+        for _ in range(MAX_STARTING_POSITION_ATTEMPTS):
+            self._generate_starting_position()
+            if self.unique_solution():
+                return
+        raise NonUniqueQuizException(
+            f"No unique starting position for {self.answer!r} in "
+            f"{MAX_STARTING_POSITION_ATTEMPTS} attempts"
+        )
+
+    def _generate_unique_starting_position_any_answer(self):
+        for _ in range(MAX_ANSWER_ATTEMPTS):
+            try:
+                self._generate_unique_starting_position()
+                return
+            except NonUniqueQuizException:
+                logger.warning(
+                    "No unique starting position for %r, selecting new answer",
+                    self.answer,
+                )
+                self.select_puzzle()
+        raise NonUniqueQuizException(
+            f"No unique starting position with p_wrong={self.p_wrong} and "
+            f"p_unknown={self.p_unknown} for {MAX_ANSWER_ATTEMPTS} answers"
+        )
+
+    @classmethod
+    def generate_batch(
+        cls,
+        n: int,
+        p_wrong: float = 0.05,
+        p_unknown: float = 0.05,
+        rng: Optional[np.random.Generator] = None,
+    ) -> List["WoordRader"]:
+        """Create `n` puzzles, generating their starting positions together
+
+        Like creating them one by one, starting positions in which another word fits
+        the correctly shown letters are regenerated, and answers for which that keeps
+        happening are replaced, for at most MAX_ANSWER_ATTEMPTS rounds. Fewer than `n`
+        puzzles are returned if no unique starting positions are found in time.
+        """
+        anagram_index = get_anagram_index(cls.n_letters)
+        states: List[WoordRaderState] = []
+        for _ in range(MAX_ANSWER_ATTEMPTS):
+            answers = [
+                str(answer)
+                for answer in random.choices(
+                    anagram_index.unique_words, k=n - len(states)
+                )
+            ]
+            states.extend(
+                generate_unique_starting_positions(answers, p_wrong, p_unknown, rng)
+            )
+            if len(states) == n:
+                break
+        return [
+            cls(p_wrong=p_wrong, p_unknown=p_unknown, state=state) for state in states
+        ]
+
+    @property
+    def anagram_index(self) -> AnagramIndex:
+        """The shared index of words consisting of the same letters"""
+        return get_anagram_index(self.n_letters)
+
+    @property
+    def candidate_words(self) -> np.ndarray:
+        """Only select answers that have no anagrams"""
+        return self.anagram_index.unique_words
 
     def create_puzzle(self):
-        """Set up a new round of the anagram game"""
-        self._generate_starting_position()
+        """Set up a new round of the anagram game
+
+        Starting positions in which another word fits the correctly shown letters are
+        regenerated; NonUniqueQuizException is raised if that keeps happening
+        """
+        self._generate_unique_starting_position()
         return self.state
 
     def unique_solution(self):
-        """Determing whether the woordrader anagram is unique"""
-        return self.answer is not None  # TODO: implement by checking for anagrams
+        """Determine whether no other word contains all correctly shown letters"""
+        return is_unique_starting_position(self.state, self.anagram_index)
 
     def get_bottom_row(self) -> List[str]:
         """Calculate what to show on the bottom row
@@ -111,20 +532,7 @@ class WoordRader(Woordpuzzel):
         List[str]
             the twelve positions and what must be shown on each position
         """
-        by_answeringposition = dict(
-            sorted(self.state.items(), key=lambda item: item[1]["answer_position"])
-        )
-
-        bottom_row = []
-        for _, state in by_answeringposition.items():
-            if state["bought"]:
-                if state["correct"]:
-                    bottom_row.append(state["true_letter"])
-                else:
-                    bottom_row.append("?")
-            else:
-                bottom_row.append("")
-        return bottom_row
+        return self.state.bottom_row()
 
     def get_top_row(self) -> List[str]:
         """Get what to show for the top row
@@ -137,12 +545,7 @@ class WoordRader(Woordpuzzel):
         List[str]
             The twelve positions
         """
-        by_quizposition = dict(sorted(self.state.items()))
-        top_row = [
-            state["shown_letter"] if not state["bought"] else ""
-            for _, state in by_quizposition.items()
-        ]
-        return top_row
+        return self.state.top_row()
 
     def show_puzzle(self, puzzle):
         """Print the current game state: letters in top and bottom row"""
@@ -175,14 +578,7 @@ class WoordRader(Woordpuzzel):
                 f"top_row_position must be an int from 1 to {self.n_letters}"
             )
 
-        top_row_state = self.state[top_row_position - 1]
-        if top_row_state["bought"]:
-            raise ValueError(f"{top_row_position} already bought!")
-
-        top_row_state["bought"] = True
-        if top_row_state["correct"]:
-            return top_row_state["answer_position"], top_row_state["true_letter"]
-        return top_row_state["answer_position"], "?"
+        return self.state.buy(top_row_position - 1)
 
     def play(self, write=True):
         """Play one round of the Woordrader game as text"""
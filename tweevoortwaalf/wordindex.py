@@ -0,0 +1,364 @@
+"""Indexes over the word lists to check puzzle uniqueness with hash lookups and bitsets
+
+Indexes are built on first use and cached on the shared word store, so they are
+built once per process and rebuilt after the word lists are reloaded.
+"""
+
+import itertools
+import logging
+import random
+from collections import Counter, defaultdict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .wordstore import WordStore, get_wordstore, read_package_wordlist
+
+logger = logging.getLogger(__name__)
+
+
+def rotate(word: str, n: int) -> str:
+    """Start at a different position
+
+    Parameters
+    ----------
+    word : str
+        The string to be rotated
+    n : int
+        The number of places to rotate; must be less than or equal to length of word
+    """
+    return word[n:] + word[:n]
+
+
+def least_rotation(word: str) -> int:
+    """The start of the lexicographically smallest rotation (Booth's algorithm)"""
+    doubled = word + word
+    failure = [-1] * len(doubled)
+    start = 0
+    for j in range(1, len(doubled)):
+        letter = doubled[j]
+        i = failure[j - start - 1]
+        while i != -1 and letter != doubled[start + i + 1]:
+            if letter < doubled[start + i + 1]:
+                start = j - i - 1
+            i = failure[i]
+        if letter != doubled[start + i + 1]:
+            # i == -1 here, so the comparison is with the start of the rotation
+            if letter < doubled[start]:
+                start = j
+            failure[j - start] = -1
+        else:
+            failure[j - start] = i + 1
+    return start
+
+
+def canonical_rotation(word: str) -> str:
+    """The lexicographically smallest rotation, identical for all rotations of a word"""
+    return rotate(word, least_rotation(word))
+
+
+def is_periodic(word: str) -> bool:
+    """Whether a non-trivial rotation of the word is the word itself"""
+    return any(rotate(word, i) == word for i in range(1, len(word)))
+
+
+class RotationIndex:  # pylint: disable=too-few-public-methods
+    """Groups words that are rotations of each other
+
+    A word has a unique solution as paardensprong if none of its rotations (other than
+    itself) is a suitable word.
+
+    Parameters
+    ----------
+    wordstore : WordStore
+        The words to index
+    """
+
+    def __init__(self, wordstore: WordStore):
+        classes: Dict[str, List[str]] = defaultdict(list)
+        for word in wordstore.words.tolist():
+            classes[canonical_rotation(word)].append(word)
+        self.classes: Dict[str, Tuple[str, ...]] = {
+            key: tuple(words) for key, words in classes.items()
+        }
+        self.rotation_class: Dict[str, str] = {
+            word: key for key, words in self.classes.items() for word in words
+        }
+        self.unique: Dict[str, bool] = {
+            word: self._check_unique(word, key)
+            for word, key in self.rotation_class.items()
+        }
+        self.unique_words = np.array(
+            [word for word in wordstore.words.tolist() if self.unique[word]], dtype=str
+        )
+        self.unique_words.flags.writeable = False
+
+    def _check_unique(self, word: str, key: str) -> bool:
+        members = self.classes.get(key, ())
+        if is_periodic(word):
+            # Any word in the class is a non-trivial rotation, possibly the word itself
+            return not members
+        return all(member == word for member in members)
+
+    def is_unique(self, word: str) -> bool:
+        """Whether no other rotation of `word` is a suitable word"""
+        try:
+            return self.unique[word]
+        except KeyError:
+            return self._check_unique(word, canonical_rotation(word))
+
+
+def get_rotation_index(n_letters: int = 8) -> RotationIndex:
+    """Get the shared rotation index for words of length `n_letters`"""
+    return get_wordstore(n_letters).derived("rotation_index", RotationIndex)
+
+
+def wildcard_key(word: str, missing_letter_index: int) -> str:
+    """The letters of `word` read around the circle, starting after the missing letter
+
+    All rotations of a word with one letter blanked out share this key, so words
+    fitting the same taartpuzzel have the same key.
+    """
+    return word[missing_letter_index + 1 :] + word[:missing_letter_index]
+
+
+class WildcardRotationIndex:
+    """Counts the words fitting each taartpuzzel: a rotation with one letter missing
+
+    Parameters
+    ----------
+    wordstore : WordStore
+        The words to index
+    """
+
+    def __init__(self, wordstore: WordStore):
+        self.wordset = wordstore.wordset
+        self.n_letters = wordstore.n_letters
+        words = wordstore.words.tolist()
+
+        self.counts: Dict[str, int] = defaultdict(int)
+        for word in words:
+            for missing_letter_index in range(self.n_letters):
+                self.counts[wildcard_key(word, missing_letter_index)] += 1
+        self.counts = dict(self.counts)
+
+        self.unique_options: Tuple[Tuple[str, int], ...] = tuple(
+            (word, missing_letter_index)
+            for word in words
+            for missing_letter_index in range(self.n_letters)
+            if self.counts[wildcard_key(word, missing_letter_index)] == 1
+        )
+        self._unique_by_missing: Dict[int, Tuple[str, ...]] = {
+            missing_letter_index: tuple(
+                word for word, i in self.unique_options if i == missing_letter_index
+            )
+            for missing_letter_index in range(self.n_letters)
+        }
+
+    def is_unique(self, word: str, missing_letter_index: int) -> bool:
+        """Whether `word` is the only suitable word fitting its taartpuzzel"""
+        n_matching = self.counts.get(wildcard_key(word, missing_letter_index), 0)
+        return n_matching == int(word in self.wordset)
+
+    def sample_unique(
+        self, missing_letter_index: Optional[int] = None
+    ) -> Tuple[str, int]:
+        """Select a random answer and missing letter index with a unique solution
+
+        Parameters
+        ----------
+        missing_letter_index : Optional[int]
+            Only select answers that are unique when this letter is missing; any letter
+            may be missing if None
+        """
+        if missing_letter_index is None:
+            return random.choice(self.unique_options)
+        return (
+            random.choice(self._unique_by_missing[missing_letter_index]),
+            missing_letter_index,
+        )
+
+
+def get_wildcard_rotation_index(n_letters: int = 9) -> WildcardRotationIndex:
+    """Get the shared wildcard rotation index for words of length `n_letters`"""
+    return get_wordstore(n_letters).derived(
+        "wildcard_rotation_index", WildcardRotationIndex
+    )
+
+
+def anagram_signature(letters: Iterable[str]) -> str:
+    """The sorted letters, identical for all anagrams"""
+    return "".join(sorted(letters))
+
+
+def _to_bitset(mask: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+
+def _bitset_ids(bitset: int, n_bits: int) -> np.ndarray:
+    as_bytes = np.frombuffer(bitset.to_bytes((n_bits + 7) // 8, "little"), np.uint8)
+    return np.flatnonzero(np.unpackbits(as_bytes, bitorder="little"))
+
+
+class AnagramIndex:
+    """Groups words by their letters, to find words that are anagrams of each other
+
+    For every letter and count, the words with at least that many of the letter are
+    kept as a bitset (bit `i` for `words[i]`), so the words containing some letters in
+    any order are found by and-ing a bitset per distinct letter.
+
+    Parameters
+    ----------
+    n_letters : int
+        The length of the words
+    words : Iterable[str]
+        The suitable words, that can be selected as answer
+    vocabulary : Iterable[str]
+        All other words a player could guess
+    """
+
+    def __init__(
+        self, n_letters: int, words: Iterable[str], vocabulary: Iterable[str] = ()
+    ):
+        self.n_letters = n_letters
+        words = list(words)
+        self.words = sorted(set(words).union(vocabulary))
+        anagrams: Dict[str, List[str]] = defaultdict(list)
+        for word in self.words:
+            anagrams[anagram_signature(word)].append(word)
+        self.anagrams: Dict[str, Tuple[str, ...]] = {
+            key: tuple(words) for key, words in anagrams.items()
+        }
+        self.unique_words = np.array(
+            [word for word in words if not self.has_other_anagrams(word)], dtype=str
+        )
+        self.unique_words.flags.writeable = False
+        self._word_bits = {word: 1 << i for i, word in enumerate(self.words)}
+        self._at_least = self._build_at_least()
+
+    def _build_at_least(self) -> Dict[Tuple[str, int], int]:
+        alphabet = sorted(set(itertools.chain.from_iterable(self.words)))
+        letter_ids = {letter: i for i, letter in enumerate(alphabet)}
+        counts = np.zeros((len(self.words), len(alphabet)), dtype=np.int8)
+        for word_id, word in enumerate(self.words):
+            for letter in word:
+                counts[word_id, letter_ids[letter]] += 1
+        return {
+            (letter, count): _to_bitset(counts[:, letter_id] >= count)
+            for letter, letter_id in letter_ids.items()
+            for count in range(1, counts[:, letter_id].max() + 1)
+        }
+
+    def has_other_anagrams(self, word: str) -> bool:
+        """Whether another word in the vocabulary consists of the same letters"""
+        return any(
+            other != word for other in self.anagrams.get(anagram_signature(word), ())
+        )
+
+    def containing(self, letters: Iterable[str]) -> int:
+        """Bitset of the words in the vocabulary that contain these letters
+
+        Parameters
+        ----------
+        letters : Iterable[str]
+            At most `n_letters` letters, each occurring as often as in the word
+        """
+        matches = (1 << len(self.words)) - 1
+        for letter, count in Counter(letters).items():
+            matches &= self._at_least.get((letter, count), 0)
+        return matches
+
+    def has_other_words_containing(self, word: str, letters: Iterable[str]) -> bool:
+        """Whether a word other than `word` contains these letters"""
+        return bool(self.containing(letters) & ~self._word_bits.get(word, 0))
+
+    def words_containing(self, letters: Iterable[str]) -> FrozenSet[str]:
+        """All words in the vocabulary that contain these letters, in any order
+
+        Parameters
+        ----------
+        letters : Iterable[str]
+            At most `n_letters` letters, each occurring as often as in the word
+        """
+        word_ids = _bitset_ids(self.containing(letters), len(self.words))
+        return frozenset(self.words[word_id] for word_id in word_ids)
+
+
+def _build_anagram_index(wordstore: WordStore) -> AnagramIndex:
+    filename = f"vocabulary_{wordstore.n_letters}_letter_words.txt"
+    try:
+        vocabulary = read_package_wordlist(filename)
+    except FileNotFoundError:
+        logger.warning(
+            "%s is not in the package data, so only the suitable words are checked "
+            "for anagrams; create it with tweevoortwaalf.suitablewordselection",
+            filename,
+        )
+        vocabulary = []
+    return AnagramIndex(wordstore.n_letters, wordstore.words.tolist(), vocabulary)
+
+
+def get_anagram_index(n_letters: int = 12) -> AnagramIndex:
+    """Get the shared anagram index for words of length `n_letters`
+
+    The index covers the full vocabulary if `vocabulary_{n_letters}_letter_words.txt`
+    is in the package data, and the suitable words otherwise. The vocabulary is made
+    from the source word list by `tweevoortwaalf.suitablewordselection` and is not
+    part of the repository, so without it a word a player could guess, but that is not
+    suitable as answer, is not seen as an anagram.
+    """
+    return get_wordstore(n_letters).derived("anagram_index", _build_anagram_index)
+
+
+class PositionLetterIndex:
+    """For every position and letter, the words with that letter there, as a bitset
+
+    Bit `i` of a bitset is set when `words[i]` matches, so the words matching several
+    known letters are found by and-ing their bitsets.
+
+    Parameters
+    ----------
+    words : Iterable[str]
+        The words, all of the same length
+    """
+
+    def __init__(self, words: Iterable[str]):
+        self.words = np.array(sorted(set(words)), dtype=str)
+        self.words.flags.writeable = False
+        self.all_words = (1 << len(self.words)) - 1
+        self._word_ids = {str(word): i for i, word in enumerate(self.words)}
+        n_letters = len(self.words[0]) if len(self.words) else 0
+        self._bitsets: List[Dict[str, int]] = [
+            defaultdict(int) for _ in range(n_letters)
+        ]
+        for i, word in enumerate(self.words):
+            for position, letter in enumerate(word):
+                self._bitsets[position][letter] |= 1 << i
+
+    def word_id(self, word: str) -> int:
+        """The bit of the word in the bitsets"""
+        return self._word_ids[word]
+
+    def matching(self, letters: Dict[int, str]) -> int:
+        """Bitset of the words with all these letters at these positions"""
+        matches = self.all_words
+        for position, letter in letters.items():
+            matches &= self._bitsets[position].get(letter, 0)
+        return matches
+
+    def word_ids(self, bitset: int) -> np.ndarray:
+        """The ids of the words in a bitset"""
+        return _bitset_ids(bitset, len(self.words))
+
+
+def get_position_letter_index(n_letters: int = 12) -> PositionLetterIndex:
+    """Get the shared position letter index of all words of length `n_letters`
+
+    Covers the same words as the anagram index, so all words a player could guess
+    """
+    return get_wordstore(n_letters).derived(
+        "position_letter_index",
+        lambda wordstore: PositionLetterIndex(
+            get_anagram_index(wordstore.n_letters).words
+        ),
+    )
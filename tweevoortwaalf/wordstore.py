@@ -0,0 +1,117 @@
+"""Process-wide, memory-resident store of the suitable word lists
+
+The word lists are read from disk once per process and shared between all puzzles
+(and all threads of a gunicorn worker). Structures derived from a word list, such
+as the uniqueness indexes, are cached on the store, so they are rebuilt
+automatically after a reload.
+"""
+
+import importlib.resources
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def read_package_wordlist(filename: str) -> List[str]:
+    """Read a file with one word per line from the package data"""
+    data_path = importlib.resources.files("tweevoortwaalf.Data").joinpath(filename)
+    return data_path.read_text(encoding="utf-8").split()
+
+
+class WordStore:
+    """Immutable collection of all suitable words of a single length
+
+    Parameters
+    ----------
+    n_letters : int
+        The length of the words
+    words : Iterable[str]
+        The suitable words
+    """
+
+    def __init__(self, n_letters: int, words: Iterable[str]):
+        self.n_letters = n_letters
+        self.words = np.array(list(words), dtype=str)
+        self.words.flags.writeable = False
+        self.wordset = frozenset(self.words.tolist())
+        self._series = None
+        self._derived: Dict[str, Any] = {}
+        # Reentrant, so a derived structure can be built from other derived structures
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_package_data(cls, n_letters: int) -> "WordStore":
+        """Load the word list for `n_letters` shipped with the package"""
+        return cls(
+            n_letters, read_package_wordlist(f"suitable_{n_letters}_letter_words.txt")
+        )
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.wordset
+
+    @property
+    def series(self) -> pd.Series:
+        """The words as pandas Series; must be treated as read-only"""
+        if self._series is None:
+            self._series = pd.Series(self.words, name="Word")
+        return self._series
+
+    def derived(self, name: str, factory: Callable[["WordStore"], Any]) -> Any:
+        """Get a structure derived from this word list, building it on first use
+
+        Parameters
+        ----------
+        name : str
+            Key under which the derived structure is cached
+        factory : Callable[[WordStore], Any]
+            Function creating the structure from this store
+        """
+        try:
+            return self._derived[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = factory(self)
+            return self._derived[name]
+
+
+_STORES: Dict[int, WordStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_wordstore(n_letters: int) -> WordStore:
+    """Get the shared word store for words of length `n_letters`
+
+    The word list is loaded on first use and kept in memory for the lifetime of the process
+    """
+    try:
+        return _STORES[n_letters]
+    except KeyError:
+        pass
+    with _STORES_LOCK:
+        if n_letters not in _STORES:
+            _STORES[n_letters] = WordStore.from_package_data(n_letters)
+        return _STORES[n_letters]
+
+
+def reload_wordstores(n_letters: Optional[int] = None) -> None:
+    """Reload the word lists from disk, e.g. after the data files have changed
+
+    Puzzles holding a reference to the old store keep using it; new lookups get the
+    fresh store and rebuild derived structures from it.
+
+    Parameters
+    ----------
+    n_letters : Optional[int]
+        Only reload the word list of this length; reload all loaded lists if None
+    """
+    with _STORES_LOCK:
+        to_reload = list(_STORES) if n_letters is None else [n_letters]
+        for n in to_reload:
+            _STORES[n] = WordStore.from_package_data(n)